@@ -5,6 +5,9 @@ import os
 import json
 import time
 import subprocess
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -12,8 +15,8 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 from datetime import datetime, date
-from contextlib import contextmanager
-from telegram.error import Forbidden, BadRequest
+from contextlib import contextmanager, asynccontextmanager
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
 
 from telegram import Update, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -29,6 +32,12 @@ from webdriver_manager.chrome import ChromeDriverManager
 
 from cryptography.fernet import Fernet
 
+from forum_http import ForumHttpClient, ForumHttpUnknownResult
+import notifier
+import outbox
+from case_status import FINAL_CASE_STATUSES
+from telegram_outbound import OutboundScheduler, SchedulerRateLimiter, PRIORITY_STATUS, PRIORITY_NOTIFICATION, PRIORITY_BROADCAST
+
 # --- Настройки ---
 # --- Загрузка конфигурации из переменных окружения или использование значений по умолчанию ---
 
@@ -70,9 +79,40 @@ USERS_TABLE_NAME = "Users_DB"
 WHITELIST_TABLE_NAME = "judge_white_list"
 CASES_TABLE_NAME = "Cases_DB"
 HELPER_TABLE_NAME = "Helper_DB"
+FORUM_JOBS_TABLE_NAME = "Forum_Jobs_DB"
+FORUM_JOBS_POLL_SECONDS = 5 # Как часто воркер проверяет очередь, если его не разбудили
+FORUM_SESSIONS_TABLE_NAME = "Forum_Sessions_DB"
+MODERATION_QUEUE_TABLE_NAME = "Moderation_Queue_DB"
+MODERATION_BATCH_WINDOW_SECONDS = 5 # Сколько ждать после первого действия, чтобы собрать пакет
+NOTIFICATION_OUTBOX_POLL_SECONDS = 1 # Как часто проверяется очередь уведомлений от скрапера
+NOTIFICATION_OUTBOX_BATCH_SIZE = 500 # Сколько ожидающих уведомлений разбирается за проход (с учетом копящихся в окне)
+BROADCASTS_TABLE_NAME = "Broadcasts_DB"
+BROADCAST_RECIPIENTS_TABLE_NAME = "Broadcast_Recipients_DB"
+BROADCAST_CONCURRENCY = 8 # Одновременных отправок в одной рассылке (общий темп задает токен-бакет)
+BROADCAST_MAX_ATTEMPTS = 3
+BROADCAST_PROGRESS_INTERVAL_SECONDS = 3 # Как часто обновляется сообщение с прогрессом рассылки
+FORUM_BASE_URL = "https://forum.arizona-rp.com/"
 BOT_OWNER_ID = 6238356535
-selenium_driver = None
-selenium_service = None
+
+# Планировщик всех исходящих сообщений бота (см. telegram_outbound.py): один на токен и процесс
+outbound_scheduler = OutboundScheduler()
+
+# Пул браузеров: N экземпляров Chrome для судей + отдельный "теплый" экземпляр владельца
+BROWSER_POOL_SIZE = int(os.getenv("FORUMNIK_BROWSER_POOL_SIZE", "2"))
+BROWSER_HEALTH_CHECK_SECONDS = 60
+BROWSER_HEALTH_CHECK_TIMEOUT = 15
+
+# Облегченный профиль браузера (FORUMNIK_LEAN_BROWSER=1): headless, стратегия загрузки 'eager',
+# ограниченный размер окна и блокировка картинок/медиа/шрифтов через CDP - скриншоты бот не делает.
+# По умолчанию выключен, пока bench_browser_profile.py не покажет выигрыш на нашем хосте
+LEAN_BROWSER = os.getenv("FORUMNIK_LEAN_BROWSER", "0") == "1"
+LEAN_WINDOW_SIZE = "1280,1024"
+BLOCKED_RESOURCE_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+                             "*.mp4", "*.webm", "*.mp3", "*.woff", "*.woff2", "*.ttf", "*.otf"]
+
+# Действия, которые сначала выполняются по HTTP без браузера (answer, pin, unpin, close).
+# Selenium остается запасным путем: при ошибке HTTP действие повторяется через браузер.
+FORUM_HTTP_ACTIONS = {action.strip() for action in os.getenv("FORUMNIK_HTTP_ACTIONS", "answer,pin,unpin,close").split(",") if action.strip()}
 
 # Состояния для ConversationHandler
 ASK_NICKNAME, ASK_PASSWORD, AWAITING_CUSTOM_REPLY, AWAITING_DOP_OFFICER_NAME = range(4)
@@ -87,8 +127,6 @@ logging.getLogger("apscheduler").setLevel(logging.WARNING)  # Снижаем у
 logging.getLogger("httpx").setLevel(logging.WARNING)  # Снижаем уровень логов httpx до WARNING
 # --- Конец настройки логирования ---
 
-selenium_driver = None
-
 # --- Функции Selenium ---
 @contextmanager
 def suppress_output():
@@ -105,22 +143,26 @@ def suppress_output():
             os.dup2(old_stderr, 2)
 
 def setup_selenium_driver():
-    global selenium_driver, selenium_service 
-    if selenium_driver is not None:
-        logger.info("Selenium WebDriver уже запущен.")
-        return selenium_driver
-
+    """Запускает новый экземпляр Chrome. Возвращает (driver, service) или (None, None) при ошибке."""
     logger.info("Инициализация Selenium WebDriver...")
     chrome_options = Options()
-    # chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("--start-maximized")
+    if LEAN_BROWSER:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument(f"--window-size={LEAN_WINDOW_SIZE}")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.page_load_strategy = 'eager'
+    else:
+        chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
     chrome_options.add_experimental_option("useAutomationExtension", False)
 
+    selenium_driver = None
+    selenium_service = None
     try:
         selenium_service = Service(ChromeDriverManager().install())
         with suppress_output():
@@ -128,23 +170,23 @@ def setup_selenium_driver():
             selenium_driver = webdriver.Chrome(service=selenium_service, options=chrome_options)
 
         selenium_driver.implicitly_wait(5)
-        logger.info("Selenium WebDriver успешно запущен.")
+        if LEAN_BROWSER:
+            selenium_driver.execute_cdp_cmd("Network.enable", {})
+            selenium_driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_PATTERNS})
+        logger.info(f"Selenium WebDriver успешно запущен{' (облегченный профиль)' if LEAN_BROWSER else ''}.")
 
         target_url = "https://forum.arizona-rp.com/forums/3400/"
         logger.info(f"Открываем целевую страницу: {target_url}")
         selenium_driver.get(target_url)
 
-        return selenium_driver
+        return selenium_driver, selenium_service
     
     except Exception as e:
         logger.error(f"Ошибка при запуске Selenium WebDriver: {e}", exc_info=True)
-        selenium_driver = None
-        selenium_service = None
-        return None
+        close_selenium_driver(selenium_driver, selenium_service)
+        return None, None
 
-def close_selenium_driver():
-    global selenium_driver, selenium_service
-    
+def close_selenium_driver(selenium_driver, selenium_service):
     if selenium_driver:
         logger.info("Закрытие Selenium WebDriver...")
         try:
@@ -152,8 +194,6 @@ def close_selenium_driver():
             logger.info("Selenium WebDriver успешно закрыт.")
         except Exception as e:
             logger.error(f"Ошибка при закрытии Selenium WebDriver: {e}", exc_info=True)
-        finally:
-            selenium_driver = None
             
     if selenium_service and selenium_service.is_connectable():
         logger.info("Остановка сервиса ChromeDriver...")
@@ -162,10 +202,141 @@ def close_selenium_driver():
             logger.info("Сервис ChromeDriver успешно остановлен.")
         except Exception as e:
             logger.error(f"Ошибка при остановке сервиса ChromeDriver: {e}", exc_info=True)
-        finally:
-            selenium_service = None
 # --- Конец функций Selenium ---
 
+# --- Браузерный воркер ---
+class BrowserWorker:
+    """
+    Владеет одним экземпляром Chrome и выполняет все действия Selenium в отдельном потоке.
+    Блокирующие вызовы WebDriver не останавливают цикл событий бота:
+    корутины отправляют воркеру действие и ожидают его результат.
+    """
+    def __init__(self, name: str = "browser-worker"):
+        self.name = name
+        self.driver = None
+        self.service = None
+        # tg_user_id аккаунта, под которым сейчас авторизован браузер (None - неизвестно/гость)
+        self.account = None
+        self.last_used = 0.0
+        # Блокировка на время воркфлоу: вход + действия одного аккаунта не перемешиваются с чужими
+        self.lock = asyncio.Lock()
+        # Один поток = все обращения к драйверу строго последовательны
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    @property
+    def is_running(self) -> bool:
+        return self.driver is not None
+
+    async def start(self):
+        """Запускает WebDriver в потоке воркера."""
+        loop = asyncio.get_running_loop()
+        self.driver, self.service = await loop.run_in_executor(self._executor, setup_selenium_driver)
+        self.account = None
+        return self.driver
+
+    async def stop(self, shutdown: bool = True):
+        """Закрывает WebDriver в потоке воркера (и, по умолчанию, останавливает сам поток)."""
+        loop = asyncio.get_running_loop()
+        driver, service = self.driver, self.service
+        self.driver, self.service, self.account = None, None, None
+        await loop.run_in_executor(self._executor, close_selenium_driver, driver, service)
+        if shutdown:
+            self._executor.shutdown(wait=True)
+
+    async def restart(self):
+        logger.warning(f"[{self.name}] Перезапуск экземпляра браузера...")
+        await self.stop(shutdown=False)
+        return await self.start()
+
+    async def health_check(self) -> bool:
+        """Проверяет, что браузер отвечает. Неработающий экземпляр перезапускается."""
+        if self.is_running:
+            try:
+                await asyncio.wait_for(self.run(lambda driver: driver.current_url), timeout=BROWSER_HEALTH_CHECK_TIMEOUT)
+                return True
+            except Exception as e:
+                logger.error(f"[{self.name}] Браузер не прошел проверку: {e}")
+        return await self.restart() is not None
+
+    async def run(self, func, *args, **kwargs):
+        """Выполняет func(driver, *args, **kwargs) в потоке воркера и возвращает результат."""
+        loop = asyncio.get_running_loop()
+        self.last_used = time.monotonic()
+        return await loop.run_in_executor(self._executor, functools.partial(self._invoke, func, args, kwargs))
+
+    def _invoke(self, func, args, kwargs):
+        if self.driver is None:
+            raise RuntimeError(f"Selenium WebDriver [{self.name}] не запущен.")
+        return func(self.driver, *args, **kwargs)
+# --- Конец браузерного воркера ---
+
+# --- Пул браузеров ---
+class BrowserPool:
+    """
+    Пул экземпляров Chrome с привязкой к аккаунтам форума.
+    Экземпляр остается авторизованным под последним аккаунтом, поэтому повторные
+    действия одного судьи попадают в "его" браузер, а воркфлоу разных судей идут параллельно.
+    Для владельца (закрепление/закрытие) выделен отдельный экземпляр.
+    """
+    def __init__(self, size: int, owner_tg_user_id: int):
+        self.owner_tg_user_id = owner_tg_user_id
+        self.workers = [BrowserWorker(f"browser-{index}") for index in range(max(1, size))]
+        self.owner_worker = BrowserWorker("browser-owner")
+
+    @property
+    def all_workers(self) -> list:
+        return [self.owner_worker] + self.workers
+
+    async def start(self):
+        await asyncio.gather(*(worker.start() for worker in self.all_workers))
+        running = sum(1 for worker in self.all_workers if worker.is_running)
+        logger.info(f"Пул браузеров запущен: {running} из {len(self.all_workers)} экземпляров.")
+
+    async def stop(self):
+        await asyncio.gather(*(worker.stop() for worker in self.all_workers))
+
+    def _pick_worker(self, tg_user_id: int) -> BrowserWorker:
+        if tg_user_id == self.owner_tg_user_id:
+            return self.owner_worker
+        # 1. Экземпляр, уже привязанный к этому аккаунту (даже если он сейчас занят)
+        for worker in self.workers:
+            if worker.account == tg_user_id:
+                return worker
+        # 2. Свободный экземпляр: сначала без привязки, затем давно не использовавшийся
+        idle_workers = [worker for worker in self.workers if not worker.lock.locked()]
+        candidates = idle_workers or self.workers
+        return min(candidates, key=lambda worker: (worker.account is not None, worker.last_used))
+
+    @asynccontextmanager
+    async def acquire(self, tg_user_id: int):
+        """Выдает экземпляр браузера для аккаунта tg_user_id на время блока async with."""
+        worker = self._pick_worker(tg_user_id)
+        async with worker.lock:
+            if not worker.is_running:
+                await worker.restart()
+            yield worker
+
+    async def health_check_loop(self, conn: sqlite3.Connection):
+        """Периодически проверяет свободные экземпляры и держит сессию владельца "теплой"."""
+        while True:
+            await asyncio.sleep(BROWSER_HEALTH_CHECK_SECONDS)
+            for worker in self.all_workers:
+                if worker.lock.locked():
+                    continue # Занятый экземпляр проверять не нужно, он и так работает
+                async with worker.lock:
+                    await worker.health_check()
+            try:
+                async with self.acquire(self.owner_tg_user_id) as worker:
+                    # login_perform обращается к форуму (см. _session_check_sync): запрос продлевает
+                    # серверную сессию владельца, а истекшая сессия сразу восстанавливается входом
+                    if not await login_perform(worker, conn, self.owner_tg_user_id):
+                        logger.error("Не удалось восстановить сессию владельца при прогреве.")
+            except Exception as e:
+                logger.error(f"Не удалось прогреть сессию владельца: {e}", exc_info=True)
+
+browser_pool = BrowserPool(BROWSER_POOL_SIZE, BOT_OWNER_ID)
+# --- Конец пула браузеров ---
+
 # ---------------------- Перформ функции (вспомогательные) -----------------------------
 
 # --- Вспомогательная функция для логирования ---
@@ -199,17 +370,15 @@ def add_note_to_case(conn: sqlite3.Connection, case_id: int, note_text: str):
 # --- Конец add_note_to_case ---
 
 # --- Функция для входа на форум ---
-async def login_perform(driver, conn, tg_user_id):
-    logger.info(f"Начинаю процесс входа на форум для пользователя {tg_user_id}...")
-    
-    # 1. Получаем данные пользователя из нашей БД
+def get_forum_credentials(conn, tg_user_id):
+    """Возвращает (nick_name, password) для входа на форум или None."""
     cursor = conn.cursor()
     cursor.execute(f"SELECT nick_name, password FROM {USERS_TABLE_NAME} WHERE tg_user_id = ?", (tg_user_id,))
     user_data = cursor.fetchone()
     
     if not user_data or not user_data[0] or not user_data[1]:
         logger.error(f"Не удалось найти полные данные (ник/пароль) для входа для пользователя {tg_user_id}.")
-        return False
+        return None
         
     nick_name, encrypted_password = user_data
     
@@ -217,13 +386,52 @@ async def login_perform(driver, conn, tg_user_id):
     password = decrypt_password(encrypted_password)
     if not password:
         logger.error(f"Не удалось расшифровать пароль для пользователя {tg_user_id}.")
+        return None
+    return nick_name, password
+
+async def login_perform(worker, conn, tg_user_id):
+    logger.info(f"Начинаю процесс входа на форум для пользователя {tg_user_id}...")
+
+    # 1-2. Получаем ник и расшифрованный пароль пользователя из нашей БД
+    credentials = get_forum_credentials(conn, tg_user_id)
+    if not credentials:
+        return False
+    nick_name, password = credentials
+
+    # 3. Браузер уже авторизован под этим аккаунтом - достаточно одного запроса к форуму без перехода
+    if worker.account == tg_user_id and await worker.run(_session_check_sync, nick_name):
+        logger.info(f"Сессия пользователя '{nick_name}' уже активна в браузере.")
+        return True
+    worker.account = None
+
+    # 4. Пытаемся восстановить сохраненную сессию из кэша
+    cached_cookies = load_forum_session(conn, tg_user_id)
+    if cached_cookies:
+        fresh_cookies = await worker.run(_restore_session_sync, cached_cookies, nick_name)
+        if fresh_cookies:
+            save_forum_session(conn, tg_user_id, fresh_cookies)
+            worker.account = tg_user_id
+            logger.info(f"Сессия пользователя '{nick_name}' восстановлена из кэша.")
+            return True
+        logger.info(f"Сохраненная сессия пользователя '{nick_name}' истекла. Выполняю полный вход.")
+        delete_forum_session(conn, tg_user_id)
+
+    # 5. Полный вход через форму (в потоке браузерного воркера)
+    if not await worker.run(_login_sync, nick_name, password):
         return False
+    save_forum_session(conn, tg_user_id, await worker.run(lambda driver: driver.get_cookies()))
+    worker.account = tg_user_id
+    return True
 
-    # 3. Выполняем действия в браузере
+def _login_sync(driver, nick_name, password):
     try:
         login_url = "https://forum.arizona-rp.com/login/"
         logger.info(f"Переход на страницу входа: {login_url}")
         driver.get(login_url)
+        # Выход больше не выполняется после каждого действия, поэтому сбрасываем cookies
+        # предыдущего аккаунта (не инвалидируя его сессию на сервере)
+        driver.delete_all_cookies()
+        driver.get(login_url)
         
         wait = WebDriverWait(driver, 10) # Ждать до 10 секунд
 
@@ -262,8 +470,144 @@ async def login_perform(driver, conn, tg_user_id):
         return False
 # --- Конец вспомогательной функции login_perform ---
 
+# --- Кэш форумных сессий ---
+# Выход с форума инвалидирует сессию на сервере, поэтому воркфлоу больше не выходят
+# из аккаунта: cookies каждого аккаунта сохраняются (в зашифрованном виде) и
+# подставляются в браузер при следующем действии от его имени.
+def save_forum_session(conn: sqlite3.Connection, tg_user_id: int, cookies: list):
+    if not cipher_suite:
+        logger.error("Fernet не инициализирован. Сессия не будет сохранена.")
+        return
+    encrypted_cookies = cipher_suite.encrypt(json.dumps(cookies).encode()).decode()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {FORUM_SESSIONS_TABLE_NAME} (tg_user_id, cookies, saved_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(tg_user_id) DO UPDATE SET cookies = excluded.cookies, saved_at = excluded.saved_at
+    """, (tg_user_id, encrypted_cookies))
+    conn.commit()
+
+def load_forum_session(conn: sqlite3.Connection, tg_user_id: int) -> list | None:
+    if not cipher_suite:
+        return None
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT cookies FROM {FORUM_SESSIONS_TABLE_NAME} WHERE tg_user_id = ?", (tg_user_id,))
+    result = cursor.fetchone()
+    if not result:
+        return None
+    try:
+        return json.loads(cipher_suite.decrypt(result[0].encode()).decode())
+    except Exception as e:
+        logger.error(f"Не удалось расшифровать сохраненную сессию пользователя {tg_user_id}: {e}")
+        return None
+
+def delete_forum_session(conn: sqlite3.Connection, tg_user_id: int):
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {FORUM_SESSIONS_TABLE_NAME} WHERE tg_user_id = ?", (tg_user_id,))
+    conn.commit()
+
+def _session_check_sync(driver, nick_name: str) -> bool:
+    """
+    Проверка сессии на сервере без перехода по страницам: страница форума запрашивается
+    через fetch() из контекста браузера (с его cookies) и проверяется data-logged-in и ник.
+    DOM открытой страницы для этого не годится - сессия могла истечь, пока браузер простаивал.
+    """
+    try:
+        if not driver.current_url.startswith(FORUM_BASE_URL):
+            driver.get(FORUM_BASE_URL)
+            return _page_session_check_sync(driver, nick_name)
+        page_html = driver.execute_async_script(
+            "var done = arguments[arguments.length - 1];"
+            "fetch(arguments[0], {credentials: 'include', cache: 'no-store'})"
+            ".then(function (response) { return response.text(); })"
+            ".then(done, function () { done(null); });",
+            FORUM_BASE_URL
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось проверить сессию на сервере: {e}")
+        return False
+    return bool(page_html) and 'data-logged-in="true"' in page_html and nick_name.lower() in page_html.lower()
+
+def _page_session_check_sync(driver, nick_name: str) -> bool:
+    """Проверка по только что загруженной странице: авторизован ли браузер под nick_name."""
+    try:
+        user_link_text = driver.execute_script(
+            "var link = document.querySelector('a.p-navgroup-link--user');"
+            "return link ? link.textContent : null;"
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось проверить сессию в браузере: {e}")
+        return False
+    return bool(user_link_text) and nick_name.lower() in user_link_text.strip().lower()
+
+def _restore_session_sync(driver, cookies: list, nick_name: str) -> list | None:
+    """Подставляет сохраненные cookies и проверяет сессию. Возвращает актуальные cookies или None."""
+    try:
+        # Cookies можно добавить только находясь на домене форума
+        if not driver.current_url.startswith(FORUM_BASE_URL):
+            driver.get(FORUM_BASE_URL)
+        driver.delete_all_cookies()
+        for cookie in cookies:
+            driver.add_cookie({key: value for key, value in cookie.items()
+                               if key in ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')})
+        driver.get(FORUM_BASE_URL)
+        if _page_session_check_sync(driver, nick_name):
+            return driver.get_cookies()
+    except Exception as e:
+        logger.warning(f"Ошибка при восстановлении сессии '{nick_name}': {e}")
+    return None
+# --- Конец кэша форумных сессий ---
+
+# --- HTTP-клиент форума ---
+# Ответы и модерация отправляются обычными HTTP-запросами (см. forum_http.py) -
+# это в разы быстрее, чем управлять Chrome. Cookies общие с браузером: клиент
+# берет сессию из Forum_Sessions_DB и сохраняет ее обратно после действия.
+forum_http_clients = {} # tg_user_id -> ForumHttpClient
+forum_http_locks = {} # tg_user_id -> asyncio.Lock (клиент одного аккаунта не потокобезопасен)
+
+async def http_forum_action(conn, tg_user_id: int, action: str, topic_link: str, reply_text: str = None) -> bool:
+    """
+    Выполняет действие на форуме по HTTP. Возвращает False, если нужно повторить
+    действие через Selenium: до отправки действия (вход, открытие темы, получение токена)
+    или при явном отказе форума. Если действие было отправлено, но результат неизвестен,
+    исключение пробрасывается дальше, чтобы не выполнить его дважды.
+    """
+    if action not in FORUM_HTTP_ACTIONS:
+        return False
+    credentials = get_forum_credentials(conn, tg_user_id)
+    if not credentials:
+        return False
+    nick_name, password = credentials
+
+    async with forum_http_locks.setdefault(tg_user_id, asyncio.Lock()):
+        client = forum_http_clients.get(tg_user_id)
+        if client is None:
+            client = ForumHttpClient(FORUM_BASE_URL)
+            client.load_cookies(load_forum_session(conn, tg_user_id))
+            forum_http_clients[tg_user_id] = client
+        try:
+            await asyncio.to_thread(client.perform, action, topic_link, nick_name, password, reply_text)
+        except ForumHttpUnknownResult as e:
+            logger.error(f"HTTP: действие '{action}' для {topic_link} отправлено, но результат неизвестен: {e}")
+            raise
+        except Exception as e:
+            logger.warning(f"HTTP: действие '{action}' для {topic_link} не выполнено ({e}). Повторяю через браузер.")
+            return False
+        save_forum_session(conn, tg_user_id, client.export_cookies())
+    return True
+# --- Конец HTTP-клиента форума ---
+
 # --- Начало вспомогательной функции logout_perform ---
-async def logout_perform(driver):
+async def logout_perform(worker, conn=None):
+    account = worker.account
+    success = await worker.run(_logout_sync)
+    if success:
+        worker.account = None
+        # После выхода сохраненные cookies этого аккаунта недействительны
+        if conn is not None and account is not None:
+            delete_forum_session(conn, account)
+    return success
+
+def _logout_sync(driver):
     logger.info("Начинаю процесс выхода из аккаунта на форуме...")
     try:
         wait = WebDriverWait(driver, 10)  # Ждать до 10 секунд
@@ -295,13 +639,27 @@ async def logout_perform(driver):
         return False
 # --- Конец вспомогательной функции logout_perform ---
 
+# --- Переход на страницу в браузере воркера ---
+async def open_page_perform(worker, url: str):
+    await worker.run(_open_page_sync, url)
+
+def _open_page_sync(driver, url: str):
+    logger.info(f"Открываю страницу: {url}")
+    driver.get(url)
+
+async def current_url_perform(worker) -> str:
+    return await worker.run(lambda driver: driver.current_url)
+# --- Конец перехода на страницу ---
+
 # --- Новая вспомогательная функция для публикации ответа на форуме ---
-async def answer_perform(driver, case_url: str, reply_text: str) -> bool:
+async def answer_perform(worker, case_url: str, reply_text: str) -> bool:
     logger.info(f"Начинаю процесс публикации ответа в теме: {case_url}")
     if not reply_text or not case_url:
         logger.error("URL иска или текст ответа не предоставлены для answer_perform.")
         return False
+    return await worker.run(_answer_sync, case_url, reply_text)
 
+def _answer_sync(driver, case_url: str, reply_text: str) -> bool:
     try:
         wait = WebDriverWait(driver, 20) # Увеличим время ожидания до 20 секунд
 
@@ -349,7 +707,10 @@ async def answer_perform(driver, case_url: str, reply_text: str) -> bool:
 # --- Конец вспомогательной функции постинга ответа ---
 
 # --- Обновленная функция pin_perform без проверки успеха ---
-async def pin_perform(driver) -> bool:
+async def pin_perform(worker) -> bool:
+    return await worker.run(_pin_sync)
+
+def _pin_sync(driver) -> bool:
     logger.info("Начинаю процесс закрепления темы (без проверки ответа)...")
     
     try:
@@ -378,8 +739,41 @@ async def pin_perform(driver) -> bool:
         return False
 # --- Конец вспомогательной функции pin_perform ---
 
+# --- Вспомогательная функция unpin_perform ---
+async def unpin_perform(worker) -> bool:
+    return await worker.run(_unpin_sync)
+
+def _unpin_sync(driver) -> bool:
+    logger.info("Начинаю процесс открепления темы...")
+    try:
+        wait = WebDriverWait(driver, 10)
+
+        menu_trigger = wait.until(EC.element_to_be_clickable(
+            (By.CSS_SELECTOR, "button.menuTrigger[title='Дополнительно']")
+        ))
+        menu_trigger.click()
+        logger.info("Нажато меню инструментов темы.")
+
+        unpin_links = driver.find_elements(By.XPATH, "//a[normalize-space()='Открепить тему']")
+        if not unpin_links:
+            logger.info("Тема не закреплена, открепление не требуется.")
+            menu_trigger.click()
+            return True
+
+        unpin_links[0].click()
+        logger.info("Нажата ссылка 'Открепить тему'. Предполагаем успех.")
+        return True
+
+    except Exception as e:
+        logger.error(f"Произошла ошибка при попытке открепить тему: {e}", exc_info=True)
+        return False
+# --- Конец вспомогательной функции unpin_perform ---
+
 # --- Новая, упрощенная функция для закрытия темы ---
-async def close_perform(driver) -> bool:
+async def close_perform(worker) -> bool:
+    return await worker.run(_close_sync)
+
+def _close_sync(driver) -> bool:
     logger.info("Начинаю процесс закрытия темы (упрощенный режим)...")
     
     try:
@@ -402,7 +796,8 @@ async def close_perform(driver) -> bool:
             unpin_links[0].click()
             logger.info("Нажата ссылка 'Открепить тему'.")
             # Ждем немного, чтобы страница успела начать перезагрузку
-            await asyncio.sleep(1) 
+            # (мы в потоке воркера, поэтому обычный sleep не блокирует бота)
+            time.sleep(1) 
         else:
             logger.info("Тема не закреплена, шаг открепления пропущен.")
             # Закрываем меню, чтобы оно не мешало
@@ -499,15 +894,15 @@ async def test_answer_perform_command(update: Update, context: ContextTypes.DEFA
         await update.message.reply_text("Первый аргумент должен быть корректной ссылкой на тему иска.")
         return
         
-    global selenium_driver
-    if not selenium_driver:
+    if not browser_pool.owner_worker.is_running:
         await update.message.reply_text("Selenium WebDriver не запущен. Не могу выполнить тест.")
         return
 
     await update.message.reply_text(f"▶️ Начинаю тестовую публикацию в теме:\n{case_url}")
     
-    # 3. Вызываем нашу асинхронную функцию
-    success = await answer_perform(selenium_driver, case_url, reply_text)
+    # 3. Вызываем нашу асинхронную функцию (под блокировкой экземпляра, как и очередь модерации)
+    async with browser_pool.acquire(BOT_OWNER_ID) as worker:
+        success = await answer_perform(worker, case_url, reply_text)
     
     # 4. Отправляем результат
     if success:
@@ -522,22 +917,23 @@ async def test_login_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("Эта тестовая команда доступна только владельцу бота.")
         return
         
-    global selenium_driver
     conn = context.bot_data['db_connection']
 
-    if not selenium_driver:
+    if not browser_pool.owner_worker.is_running:
         await update.message.reply_text("Selenium WebDriver не запущен. Не могу выполнить тест.")
         return
 
     await update.message.reply_text("▶️ Начинаю тестовый вход на форум...")
     
     # Вызываем нашу асинхронную функцию входа
-    success = await login_perform(selenium_driver, conn, BOT_OWNER_ID)
+    async with browser_pool.acquire(BOT_OWNER_ID) as worker:
+        success = await login_perform(worker, conn, BOT_OWNER_ID)
+        if success:
+            # После входа можно перейти обратно на страницу исков
+            await open_page_perform(worker, "https://forum.arizona-rp.com/forums/3400/")
     
     if success:
         await update.message.reply_text("✅ Тестовый вход выполнен успешно!")
-        # После входа можно перейти обратно на страницу исков
-        selenium_driver.get("https://forum.arizona-rp.com/forums/3400/")
     else:
         await update.message.reply_text("❌ Ошибка во время тестового входа. Смотрите логи в консоли для деталей.")
 # --- Конец тестовой команды для проверки входа ---
@@ -549,15 +945,15 @@ async def test_logout_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("Эта тестовая команда доступна только владельцу бота.")
         return
         
-    global selenium_driver
-    if not selenium_driver:
+    if not browser_pool.owner_worker.is_running:
         await update.message.reply_text("Selenium WebDriver не запущен. Не могу выполнить тест.")
         return
 
     await update.message.reply_text("▶️ Начинаю тестовый выход с форума...")
     
     # Вызываем нашу асинхронную функцию выхода
-    success = await logout_perform(selenium_driver)
+    async with browser_pool.acquire(BOT_OWNER_ID) as worker:
+        success = await logout_perform(worker, context.bot_data['db_connection'])
     
     if success:
         await update.message.reply_text("✅ Тестовый выход выполнен успешно!")
@@ -571,15 +967,14 @@ async def test_pin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("Эта тестовая команда доступна только владельцу бота.")
         return
         
-    global selenium_driver
-    if not selenium_driver:
+    if not browser_pool.owner_worker.is_running:
         await update.message.reply_text("Selenium WebDriver не запущен. Не могу выполнить тест.")
         return
     
-    current_url = selenium_driver.current_url
-    await update.message.reply_text(f"▶️ Начинаю тест закрепления темы на текущей странице:\n{current_url}")
-    
-    success = await pin_perform(selenium_driver)
+    async with browser_pool.acquire(BOT_OWNER_ID) as worker:
+        current_url = await current_url_perform(worker)
+        await update.message.reply_text(f"▶️ Начинаю тест закрепления темы на текущей странице:\n{current_url}")
+        success = await pin_perform(worker)
     if success:
         await update.message.reply_text("✅ Тест закрепления темы прошел успешно!")
     else:
@@ -592,15 +987,14 @@ async def test_close_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("Эта тестовая команда доступна только владельцу бота.")
         return
         
-    global selenium_driver
-    if not selenium_driver:
+    if not browser_pool.owner_worker.is_running:
         await update.message.reply_text("Selenium WebDriver не запущен. Не могу выполнить тест.")
         return
     
-    current_url = selenium_driver.current_url
-    await update.message.reply_text(f"▶️ Начинаю тест закрытия темы на текущей странице:\n{current_url}")
-    
-    success = await close_perform(selenium_driver)
+    async with browser_pool.acquire(BOT_OWNER_ID) as worker:
+        current_url = await current_url_perform(worker)
+        await update.message.reply_text(f"▶️ Начинаю тест закрытия темы на текущей странице:\n{current_url}")
+        success = await close_perform(worker)
     
     if success:
         await update.message.reply_text("✅ Тест закрытия темы прошел успешно!")
@@ -653,7 +1047,73 @@ def setup_database():
         marker_desc TEXT
     )
     """)
+    # Очередь форумных задач (отказ, опровержение, свой ответ)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {FORUM_JOBS_TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_type TEXT NOT NULL,
+        case_id INTEGER NOT NULL,
+        judge_tg_user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        status_message_id INTEGER,
+        payload TEXT,
+        status TEXT NOT NULL DEFAULT 'queued', -- queued / running / done / failed
+        step TEXT,                             -- последний успешно выполненный шаг
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # Очередь модерации владельца (закрепление, открепление, закрытие тем)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {MODERATION_QUEUE_TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic_link TEXT NOT NULL,
+        action TEXT NOT NULL,                  -- pin / unpin / close
+        case_id INTEGER,
+        job_id INTEGER,                        -- задача Forum_Jobs_DB, породившая действие
+        chat_id INTEGER,
+        status_message_id INTEGER,
+        done_text TEXT,
+        status TEXT NOT NULL DEFAULT 'queued', -- queued / running / done / failed
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # Кэш форумных сессий (зашифрованные cookies) по аккаунтам
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {FORUM_SESSIONS_TABLE_NAME} (
+        tg_user_id INTEGER PRIMARY KEY,
+        cookies TEXT NOT NULL,
+        saved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # Рассылки /broadcast и их получатели: по этим таблицам прерванная рассылка продолжается с места остановки
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {BROADCASTS_TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_tg_user_id INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL,
+        status_message_id INTEGER,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running', -- running / done / failed
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    """)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {BROADCAST_RECIPIENTS_TABLE_NAME} (
+        broadcast_id INTEGER NOT NULL,
+        tg_user_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending', -- pending / sent / failed / blocked
+        error TEXT,
+        PRIMARY KEY (broadcast_id, tg_user_id)
+    )
+    """)
     conn.commit()
+    # Очередь уведомлений скрапера (см. outbox.py)
+    outbox.setup_outbox(conn)
 
     # Проверка и добавление колонки is_admin, если ее нет
     existing_columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({USERS_TABLE_NAME})").fetchall()]
@@ -664,6 +1124,15 @@ def setup_database():
             conn.commit()
         except sqlite3.Error as e_alter:
             logger.error(f"Ошибка при добавлении колонки 'is_admin' в '{USERS_TABLE_NAME}': {e_alter}")
+
+    # Колонка bot_blocked: пользователь заблокировал бота (Forbidden), рассылки его пропускают до /start
+    if 'bot_blocked' not in existing_columns:
+        try:
+            cursor.execute(f"ALTER TABLE {USERS_TABLE_NAME} ADD COLUMN bot_blocked INTEGER DEFAULT 0")
+            logger.info(f"Добавлена колонка 'bot_blocked' в таблицу '{USERS_TABLE_NAME}'.")
+            conn.commit()
+        except sqlite3.Error as e_alter:
+            logger.error(f"Ошибка при добавлении колонки 'bot_blocked' в '{USERS_TABLE_NAME}': {e_alter}")
             
     return conn
 
@@ -1186,8 +1655,8 @@ async def button_callback_router(update: Update, context: ContextTypes.DEFAULT_T
 # --- начало handle_rejection_workflow ---
 async def handle_rejection_workflow(update: Update, context: ContextTypes.DEFAULT_TYPE, case_id: int, rejection_type: str):
     """
-    Полный воркфлоу для обработки кнопок отказа.
-    Версия с исправленной логикой редактирования сообщений.
+    Воркфлоу для обработки кнопок отказа.
+    Готовит данные и ставит форумную часть в очередь задач, не дожидаясь ее выполнения.
     """
     query = update.callback_query
     # Редактируем исходное сообщение с фото ОДИН РАЗ, убирая кнопки
@@ -1197,7 +1666,6 @@ async def handle_rejection_workflow(update: Update, context: ContextTypes.DEFAUL
     status_message = await context.bot.send_message(chat_id=query.message.chat_id, text="Пожалуйста, подождите... ⏳")
 
     conn = context.bot_data['db_connection']
-    driver = selenium_driver
     judge_tg_user_id = query.from_user.id
     
     rejection_map = {'c': 'nomer', 'd': 'forma', 'e': 'system'}
@@ -1232,31 +1700,14 @@ async def handle_rejection_workflow(update: Update, context: ContextTypes.DEFAUL
         topic_link = case_data_db[2]
         final_reply_text = await text_editor_helper(conn, template_text, data_context)
         
-        # --- Сессия Судьи ---
-        await status_message.edit_text(text=f"Вхожу в аккаунт судьи {judge_nick_name}...")
-        if not await login_perform(driver, conn, judge_tg_user_id):
-            raise Exception("Не удалось войти в аккаунт судьи.")
-        
-        await status_message.edit_text(text="Публикую ответ на форуме...")
-        if not await answer_perform(driver, topic_link, final_reply_text):
-            raise Exception("Не удалось опубликовать ответ на форуме.")
-        
-        await logout_perform(driver)
-
-        # --- Сессия Владельца ---
-        await status_message.edit_text(text="Вхожу в аккаунт владельца для закрытия темы...")
-        if not await login_perform(driver, conn, BOT_OWNER_ID):
-            raise Exception("Не удалось войти в аккаунт владельца.")
-            
-        driver.get(topic_link)
-        
-        await status_message.edit_text(text="Закрываю тему на форуме...")
-        if not await close_perform(driver):
-            raise Exception("Не удалось закрыть тему на форуме.")
-
-        await logout_perform(driver)
-
-        await status_message.edit_text(text=f"✅ Готово! Иск #{case_id} успешно отклонен и закрыт на форуме.")
+        # 2. Форумная часть (судья -> ответ, владелец -> закрытие) уходит в очередь
+        await submit_forum_job(context, 'reject', case_id, judge_tg_user_id, status_message, {
+            'topic_link': topic_link,
+            'reply_text': final_reply_text,
+            'judge_nick_name': judge_nick_name,
+            'owner_action': 'close',
+            'done_text': f"✅ Готово! Иск #{case_id} успешно отклонен и закрыт на форуме.",
+        })
 
     except Exception as e:
         logger.error(f"Ошибка в воркфлоу отказа для иска {case_id}: {e}", exc_info=True)
@@ -1266,8 +1717,8 @@ async def handle_rejection_workflow(update: Update, context: ContextTypes.DEFAUL
 # --- handle_refutation_workflow ---
 async def handle_refutation_workflow(update: Update, context: ContextTypes.DEFAULT_TYPE, case_id: int):
     """
-    Полный воркфлоу для кнопки "Запрос опровержения".
-    Версия с исправленной логикой редактирования сообщений.
+    Воркфлоу для кнопки "Запрос опровержения".
+    Готовит данные и ставит форумную часть в очередь задач, не дожидаясь ее выполнения.
     """
     query = update.callback_query
     await query.edit_message_caption(caption=f"✅ Команда принята. Начинаю запрос опровержения для иска #{case_id}...", reply_markup=None)
@@ -1275,7 +1726,6 @@ async def handle_refutation_workflow(update: Update, context: ContextTypes.DEFAU
     status_message = await context.bot.send_message(chat_id=query.message.chat_id, text="Пожалуйста, подождите... ⏳")
 
     conn = context.bot_data['db_connection']
-    driver = selenium_driver
     judge_tg_user_id = query.from_user.id
     template_marker = 'opra'
 
@@ -1306,48 +1756,15 @@ async def handle_refutation_workflow(update: Update, context: ContextTypes.DEFAU
         topic_link = case_data_db[2]
         final_reply_text = await text_editor_helper(conn, template_text, data_context)
         
-        # 2. Сессия Судьи
-        await status_message.edit_text(text=f"Иск #{case_id}: Вхожу в аккаунт судьи {judge_nick_name}...")
-        if not await login_perform(driver, conn, judge_tg_user_id):
-            raise Exception("Не удалось войти в аккаунт судьи.")
-        
-        await status_message.edit_text(text=f"Иск #{case_id}: Публикую ответ на форуме...")
-        if not await answer_perform(driver, topic_link, final_reply_text):
-            raise Exception("Не удалось опубликовать ответ на форуме.")
-        
-        await logout_perform(driver)
-
-        # 3. Сессия Владельца
-        await status_message.edit_text(text=f"Иск #{case_id}: Вхожу в аккаунт владельца для закрепления темы...")
-        if not await login_perform(driver, conn, BOT_OWNER_ID):
-            raise Exception("Не удалось войти в аккаунт владельца.")
-            
-        driver.get(topic_link)
-        
-        await status_message.edit_text(text=f"Иск #{case_id}: Закрепляю тему на форуме...")
-        if not await pin_perform(driver):
-            raise Exception("Не удалось закрепить тему на форуме.")
-
-        await logout_perform(driver)
-        
-        # Удаляем промежуточное сообщение
-        await status_message.delete()
-        
-        # Показываем новую клавиатуру
-        rebuttal_keyboard = [
-            [InlineKeyboardButton("🚓 Розыск", callback_data=f"rebuttal_choice:Розыск:{case_id}"), 
-             InlineKeyboardButton("⛓️ Арест", callback_data=f"rebuttal_choice:Арест:{case_id}")],
-            [InlineKeyboardButton("🅿️ Штрафстоянка", callback_data=f"rebuttal_choice:Штрафстоянка:{case_id}"), 
-             InlineKeyboardButton("🧾 Штраф", callback_data=f"rebuttal_choice:Штраф:{case_id}")],
-            [InlineKeyboardButton("⏳ Срок", callback_data=f"rebuttal_choice:Срок:{case_id}"), 
-             InlineKeyboardButton("🧱 Карцер", callback_data=f"rebuttal_choice:Картцер:{case_id}")]
-        ]
-        reply_markup = InlineKeyboardMarkup(rebuttal_keyboard)
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=f"✅ Ответ на форуме опубликован, тема закреплена для иска #{case_id}.\n\nТеперь, пожалуйста, **выберите тип запрошенного опровержения**:",
-            reply_markup=reply_markup
-        )
+        # 2. Форумная часть (судья -> ответ, владелец -> закрепление) уходит в очередь.
+        # Клавиатуру выбора типа опровержения покажет воркер после выполнения задачи.
+        await submit_forum_job(context, 'refutation', case_id, judge_tg_user_id, status_message, {
+            'topic_link': topic_link,
+            'reply_text': final_reply_text,
+            'judge_nick_name': judge_nick_name,
+            'owner_action': 'pin',
+            'done_text': f"✅ Готово! Тема иска #{case_id} закреплена на форуме.",
+        })
 
     except Exception as e:
         logger.error(f"Ошибка в воркфлоу запроса опровержения для иска {case_id}: {e}", exc_info=True)
@@ -1355,6 +1772,18 @@ async def handle_refutation_workflow(update: Update, context: ContextTypes.DEFAU
         await status_message.edit_text(text=f"❌ Произошла ошибка: {e}\n\nСтатус иска #{case_id} не был изменен. Проверьте логи.")
 # --- Конец handle_refutation_workflow ---
 
+def build_rebuttal_keyboard(case_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура выбора типа опровержения (общая для основного воркфлоу и /dop)."""
+    rebuttal_keyboard = [
+        [InlineKeyboardButton("🚓 Розыск", callback_data=f"rebuttal_choice:Розыск:{case_id}"), 
+         InlineKeyboardButton("⛓️ Арест", callback_data=f"rebuttal_choice:Арест:{case_id}")],
+        [InlineKeyboardButton("🅿️ Штрафстоянка", callback_data=f"rebuttal_choice:Штрафстоянка:{case_id}"), 
+         InlineKeyboardButton("🧾 Штраф", callback_data=f"rebuttal_choice:Штраф:{case_id}")],
+        [InlineKeyboardButton("⏳ Срок", callback_data=f"rebuttal_choice:Срок:{case_id}"), 
+         InlineKeyboardButton("🧱 Карцер", callback_data=f"rebuttal_choice:Картцер:{case_id}")]
+    ]
+    return InlineKeyboardMarkup(rebuttal_keyboard)
+
 # --- Начало handle_rebuttal_choice ---
 async def handle_rebuttal_choice(update: Update, context: ContextTypes.DEFAULT_TYPE, case_id: int, rebuttal_type: str):
     """
@@ -1455,15 +1884,7 @@ async def dop_received_officer_name(update: Update, context: ContextTypes.DEFAUL
     context.user_data['dop_officer_name'] = new_officer_name
     
     # Показываем ту же клавиатуру, что и в основном воркфлоу
-    rebuttal_keyboard = [
-            [InlineKeyboardButton("🚓 Розыск", callback_data=f"rebuttal_choice:Розыск:{case_id}"), 
-             InlineKeyboardButton("⛓️ Арест", callback_data=f"rebuttal_choice:Арест:{case_id}")],
-            [InlineKeyboardButton("🅿️ Штрафстоянка", callback_data=f"rebuttal_choice:Штрафстоянка:{case_id}"), 
-             InlineKeyboardButton("🧾 Штраф", callback_data=f"rebuttal_choice:Штраф:{case_id}")],
-            [InlineKeyboardButton("⏳ Срок", callback_data=f"rebuttal_choice:Срок:{case_id}"), 
-             InlineKeyboardButton("🧱 Карцер", callback_data=f"rebuttal_choice:Картцер:{case_id}")]
-        ]
-    reply_markup = InlineKeyboardMarkup(rebuttal_keyboard)
+    reply_markup = build_rebuttal_keyboard(case_id)
     
     await update.message.reply_text(
         f"Отлично. Теперь выберите тип запроса для офицера **{new_officer_name}**:",
@@ -1569,7 +1990,7 @@ async def custom_reply_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 async def received_custom_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Получает текст от судьи и запускает соответствующий воркфлоу публикации."""
+    """Получает текст от судьи и ставит публикацию ответа в очередь форумных задач."""
     custom_text = update.message.text
     # Извлекаем из user_data и ID, и ТИП ответа
     case_id = context.user_data.get('custom_reply_case_id')
@@ -1579,10 +2000,9 @@ async def received_custom_reply(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("Произошла ошибка, ID иска или тип ответа не найден. Пожалуйста, начните заново.")
         return ConversationHandler.END
 
-    await update.message.reply_text(f"✅ Текст получен. Начинаю публикацию для иска #{case_id}... ⏳")
+    status_message = await update.message.reply_text(f"✅ Текст получен. Начинаю публикацию для иска #{case_id}... ⏳")
     
     conn = context.bot_data['db_connection']
-    driver = selenium_driver
     judge_tg_user_id = update.effective_user.id
     
     # Статус и маркер шаблона в зависимости от типа ответа
@@ -1624,36 +2044,23 @@ async def received_custom_reply(update: Update, context: ContextTypes.DEFAULT_TY
         topic_link = case_data_db[2]
         final_reply_text = await text_editor_helper(conn, template_text, data_context)
         
-        # 2. Сессия Судьи: логин, публикация, выход
-        if not await login_perform(driver, conn, judge_tg_user_id):
-            raise Exception("Не удалось войти в аккаунт судьи.")
-        
-        if not await answer_perform(driver, topic_link, final_reply_text):
-            raise Exception("Не удалось опубликовать ответ на форуме.")
-            
-        await logout_perform(driver)
-        
-        # 3. ЕСЛИ ОТВЕТ ФИНАЛЬНЫЙ - ЗАПУСКАЕМ СЕССИЮ ВЛАДЕЛЬЦА ДЛЯ ЗАКРЫТИЯ
+        # 2. Публикация (и закрытие темы владельцем для финального ответа) уходит в очередь
         if reply_type == 'final':
-            await update.message.reply_text("Ответ опубликован. Вхожу под аккаунтом владельца для закрытия темы...")
-            
-            if not await login_perform(driver, conn, BOT_OWNER_ID):
-                raise Exception("Не удалось войти в аккаунт владельца.")
-            
-            driver.get(topic_link)
-            
-            if not await close_perform(driver):
-                raise Exception("Не удалось закрыть тему на форуме.")
-            
-            await asyncio.sleep (5)
-            logger.info("Пауза в 5 секунд, чтобы убралась плашка")
-                
-            await logout_perform(driver)
-            logger.info(f"Финальный ответ для иска #{case_id} опубликован, тема закрыта.")
-            await update.message.reply_text(f"✅ Готово! Ваш финальный ответ для иска #{case_id} опубликован, тема на форуме закрыта.")
+            job_payload = {
+                'owner_action': 'close',
+                'done_text': f"✅ Готово! Ваш финальный ответ для иска #{case_id} опубликован, тема на форуме закрыта.",
+            }
         else:
-            logger.info(f"Промежуточный ответ для иска #{case_id} опубликован.")
-            await update.message.reply_text(f"✅ Готово! Ваш промежуточный ответ для иска #{case_id} опубликован на форуме.")
+            job_payload = {
+                'owner_action': None,
+                'done_text': f"✅ Готово! Ваш промежуточный ответ для иска #{case_id} опубликован на форуме.",
+            }
+        job_payload.update({
+            'topic_link': topic_link,
+            'reply_text': final_reply_text,
+            'judge_nick_name': judge_nick_name,
+        })
+        await submit_forum_job(context, 'custom_reply', case_id, judge_tg_user_id, status_message, job_payload)
 
     except Exception as e:
         logger.error(f"Ошибка в воркфлоу кастомного ответа для иска {case_id}: {e}", exc_info=True)
@@ -1676,6 +2083,328 @@ async def cancel_custom_reply(update: Update, context: ContextTypes.DEFAULT_TYPE
     return ConversationHandler.END
 # --- Конец функций для диалога ---
 
+# --- Очередь форумных задач ---
+# Форумная часть воркфлоу (вход судьи, ответ, вход владельца, закрытие/закрепление)
+# выполняется отдельным воркером по порядку поступления. Задачи хранятся в БД,
+# поэтому незавершенные задачи переживают перезапуск бота.
+FORUM_JOB_COLUMNS = "id, job_type, case_id, judge_tg_user_id, chat_id, status_message_id, payload, step"
+
+def enqueue_forum_job(conn: sqlite3.Connection, job_type: str, case_id: int, judge_tg_user_id: int,
+                      chat_id: int, status_message_id: int, payload: dict) -> int:
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {FORUM_JOBS_TABLE_NAME} (job_type, case_id, judge_tg_user_id, chat_id, status_message_id, payload)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (job_type, case_id, judge_tg_user_id, chat_id, status_message_id, json.dumps(payload, ensure_ascii=False)))
+    conn.commit()
+    logger.info(f"Задача #{cursor.lastrowid} ({job_type}) для иска #{case_id} поставлена в очередь.")
+    return cursor.lastrowid
+
+def update_forum_job(conn: sqlite3.Connection, job_id: int, **fields):
+    """Обновляет указанные поля задачи (status, step, error) и время изменения."""
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"UPDATE {FORUM_JOBS_TABLE_NAME} SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (*fields.values(), job_id)
+    )
+    conn.commit()
+
+def get_forum_job_position(conn: sqlite3.Connection, job_id: int) -> int:
+    """Возвращает позицию задачи в очереди (1 - следующая на выполнение)."""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT COUNT(*) FROM {FORUM_JOBS_TABLE_NAME} WHERE status IN ('queued', 'running') AND id <= ?",
+        (job_id,)
+    )
+    return cursor.fetchone()[0]
+
+def fetch_queued_forum_jobs(conn: sqlite3.Connection) -> list:
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {FORUM_JOB_COLUMNS} FROM {FORUM_JOBS_TABLE_NAME} WHERE status = 'queued' ORDER BY id ASC")
+    return cursor.fetchall()
+
+def recover_forum_jobs(conn: sqlite3.Connection) -> int:
+    """Возвращает в очередь задачи, прерванные остановкой бота."""
+    cursor = conn.cursor()
+    cursor.execute(f"UPDATE {FORUM_JOBS_TABLE_NAME} SET status = 'queued' WHERE status = 'running'")
+    conn.commit()
+    cursor.execute(f"SELECT COUNT(*) FROM {FORUM_JOBS_TABLE_NAME} WHERE status = 'queued'")
+    pending = cursor.fetchone()[0]
+    if pending:
+        logger.info(f"В очереди форумных задач после перезапуска: {pending}.")
+    return pending
+
+async def submit_forum_job(context: ContextTypes.DEFAULT_TYPE, job_type: str, case_id: int,
+                           judge_tg_user_id: int, status_message, payload: dict) -> int:
+    """Ставит задачу в очередь, будит воркер и сообщает судье позицию в очереди."""
+    conn = context.bot_data['db_connection']
+    job_id = enqueue_forum_job(conn, job_type, case_id, judge_tg_user_id,
+                               status_message.chat_id, status_message.message_id, payload)
+    context.bot_data['forum_jobs_wakeup'].set()
+    position = get_forum_job_position(conn, job_id)
+    await status_message.edit_text(text=f"🕓 Иск #{case_id}: задача поставлена в очередь (позиция {position}).")
+    return job_id
+
+async def report_forum_job_progress(bot, chat_id: int, message_id: int, text: str):
+    """Обновляет статусное сообщение судьи. Ошибки Telegram не должны ронять задачу."""
+    if not message_id:
+        return
+    try:
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+    except TelegramError as e: # BadRequest, а также TimedOut/NetworkError
+        logger.warning(f"Не удалось обновить статусное сообщение {message_id}: {e}")
+
+async def run_forum_job(application: Application, job) -> None:
+    job_id, job_type, case_id, judge_tg_user_id, chat_id, status_message_id, payload_json, step = job
+    payload = json.loads(payload_json)
+    conn = application.bot_data['db_connection']
+    bot = application.bot
+    topic_link = payload['topic_link']
+    owner_action = payload.get('owner_action')
+
+    async def report(text):
+        await report_forum_job_progress(bot, chat_id, status_message_id, text)
+
+    logger.info(f"Начинаю выполнение задачи #{job_id} ({job_type}) для иска #{case_id}, шаг: {step}.")
+    update_forum_job(conn, job_id, status='running')
+
+    try:
+        # 1. Сессия Судьи: сначала HTTP, затем браузер как запасной путь
+        # (пропускается, если ответ уже был опубликован до перезапуска)
+        if step not in ('answer_posted', 'moderation_queued'):
+            await report(f"Иск #{case_id}: Публикую ответ на форуме от имени {payload.get('judge_nick_name')}...")
+            if await http_forum_action(conn, judge_tg_user_id, 'answer', topic_link, payload['reply_text']):
+                step = 'answer_posted'
+                update_forum_job(conn, job_id, step=step)
+
+        if step not in ('answer_posted', 'moderation_queued'):
+            async with browser_pool.acquire(judge_tg_user_id) as worker:
+                await report(f"Иск #{case_id}: Вхожу в аккаунт судьи {payload.get('judge_nick_name')}...")
+                if not await login_perform(worker, conn, judge_tg_user_id):
+                    raise Exception("Не удалось войти в аккаунт судьи.")
+                update_forum_job(conn, job_id, step='judge_login')
+
+                await report(f"Иск #{case_id}: Публикую ответ на форуме...")
+                if not await answer_perform(worker, topic_link, payload['reply_text']):
+                    raise Exception("Не удалось опубликовать ответ на форуме.")
+                step = 'answer_posted'
+                update_forum_job(conn, job_id, step=step)
+
+        # 2. Действие владельца (закрытие или закрепление) уходит в общую очередь модерации,
+        # которую одна сессия владельца разбирает пакетами
+        if owner_action and step != 'moderation_queued':
+            enqueue_moderation_action(conn, topic_link, owner_action, case_id, job_id,
+                                      chat_id, status_message_id, payload.get('done_text'))
+            application.bot_data['moderation_wakeup'].set()
+            update_forum_job(conn, job_id, step='moderation_queued')
+
+        update_forum_job(conn, job_id, status='done')
+        logger.info(f"Задача #{job_id} ({job_type}) для иска #{case_id} выполнена.")
+
+        # 3. Сообщение судье (итог модерации придет отдельно в это же статусное сообщение)
+        if job_type == 'refutation':
+            await report(f"✅ Иск #{case_id}: ответ на форуме опубликован. Тема ожидает закрепления владельцем... ⏳")
+            await bot.send_message(
+                chat_id=chat_id,
+                text=f"✅ Ответ на форуме опубликован для иска #{case_id}.\n\nТеперь, пожалуйста, **выберите тип запрошенного опровержения**:",
+                reply_markup=build_rebuttal_keyboard(case_id)
+            )
+        elif owner_action:
+            await report(f"✅ Иск #{case_id}: ответ на форуме опубликован. Тема ожидает закрытия владельцем... ⏳")
+        else:
+            await report(payload.get('done_text', f"✅ Готово! Задача по иску #{case_id} выполнена."))
+
+    except Exception as e:
+        logger.error(f"Ошибка в задаче #{job_id} ({job_type}) для иска {case_id}: {e}", exc_info=True)
+        update_forum_job(conn, job_id, status='failed', error=str(e))
+        await report(f"❌ Произошла ошибка: {e}\n\nПожалуйста, проверьте состояние иска #{case_id} вручную.")
+
+async def forum_job_worker(application: Application) -> None:
+    """
+    Бесконечный цикл диспетчера очереди. Задачи одного судьи выполняются строго по порядку,
+    задачи разных судей - параллельно (не больше, чем экземпляров в пуле браузеров).
+    """
+    conn = application.bot_data['db_connection']
+    wakeup = application.bot_data['forum_jobs_wakeup']
+    running_jobs = {} # judge_tg_user_id -> asyncio.Task
+    max_parallel_jobs = len(browser_pool.workers)
+
+    def on_job_finished(judge_tg_user_id):
+        running_jobs.pop(judge_tg_user_id, None)
+        wakeup.set()
+
+    logger.info(f"Воркер очереди форумных задач запущен (параллельно до {max_parallel_jobs} задач).")
+    try:
+        while True:
+            wakeup.clear()
+            for job in fetch_queued_forum_jobs(conn):
+                judge_tg_user_id = job[3]
+                if judge_tg_user_id in running_jobs or len(running_jobs) >= max_parallel_jobs:
+                    continue
+                task = asyncio.create_task(run_forum_job(application, job))
+                running_jobs[judge_tg_user_id] = task
+                task.add_done_callback(lambda _, judge=judge_tg_user_id: on_job_finished(judge))
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=FORUM_JOBS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # При остановке бота прерываем выполняющиеся задачи: они останутся в статусе 'running'
+        # и будут возвращены в очередь при следующем запуске
+        for task in running_jobs.values():
+            task.cancel()
+# --- Конец очереди форумных задач ---
+
+# --- Пакетная модерация владельца ---
+# Закрепление/открепление/закрытие тем от всех судей собираются в одну очередь.
+# Одна сессия владельца разбирает накопившийся пакет тема за темой и сообщает
+# результат каждому судье в его статусное сообщение.
+MODERATION_ACTIONS = {
+    'pin': (pin_perform, "Закрепляю тему"),
+    'unpin': (unpin_perform, "Открепляю тему"),
+    'close': (close_perform, "Закрываю тему"),
+}
+
+def enqueue_moderation_action(conn: sqlite3.Connection, topic_link: str, action: str, case_id: int = None,
+                              job_id: int = None, chat_id: int = None, status_message_id: int = None,
+                              done_text: str = None) -> int:
+    if action not in MODERATION_ACTIONS:
+        raise ValueError(f"Неизвестное действие модерации: {action}")
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {MODERATION_QUEUE_TABLE_NAME} (topic_link, action, case_id, job_id, chat_id, status_message_id, done_text)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (topic_link, action, case_id, job_id, chat_id, status_message_id, done_text))
+    conn.commit()
+    logger.info(f"Действие модерации '{action}' для иска #{case_id} поставлено в очередь (#{cursor.lastrowid}).")
+    return cursor.lastrowid
+
+def update_moderation_action(conn: sqlite3.Connection, item_id: int, **fields):
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"UPDATE {MODERATION_QUEUE_TABLE_NAME} SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (*fields.values(), item_id)
+    )
+    conn.commit()
+
+def fetch_queued_moderation_actions(conn: sqlite3.Connection) -> list:
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT id, topic_link, action, case_id, chat_id, status_message_id, done_text
+        FROM {MODERATION_QUEUE_TABLE_NAME} WHERE status = 'queued' ORDER BY id ASC
+    """)
+    return cursor.fetchall()
+
+def recover_moderation_actions(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    cursor.execute(f"UPDATE {MODERATION_QUEUE_TABLE_NAME} SET status = 'queued' WHERE status = 'running'")
+    conn.commit()
+
+async def run_moderation_pass(application: Application) -> int:
+    """Разбирает всю очередь модерации за одну сессию владельца. Возвращает число обработанных действий."""
+    conn = application.bot_data['db_connection']
+    bot = application.bot
+    processed = 0
+
+    async with browser_pool.acquire(BOT_OWNER_ID) as worker:
+        logged_in = None # Вход в браузер выполняется, только если HTTP-путь не сработал
+        while True:
+            # Действия, пришедшие во время прохода, тоже попадают в этот же пакет
+            items = fetch_queued_moderation_actions(conn)
+            if not items:
+                break
+
+            # Группируем по теме, сохраняя порядок поступления
+            items_by_topic = {}
+            for item in items:
+                items_by_topic.setdefault(item[1], []).append(item)
+
+            for topic_link, topic_items in items_by_topic.items():
+                for item_id, _, action, case_id, chat_id, status_message_id, done_text in topic_items:
+                    perform, action_text = MODERATION_ACTIONS[action]
+                    update_moderation_action(conn, item_id, status='running')
+                    try:
+                        await report_forum_job_progress(bot, chat_id, status_message_id, f"Иск #{case_id}: {action_text} на форуме...")
+                        if not await http_forum_action(conn, BOT_OWNER_ID, action, topic_link):
+                            if logged_in is None:
+                                logged_in = await login_perform(worker, conn, BOT_OWNER_ID)
+                            if not logged_in:
+                                raise Exception("Не удалось войти в аккаунт владельца.")
+                            await open_page_perform(worker, topic_link)
+                            if not await perform(worker):
+                                raise Exception(f"Не удалось выполнить действие '{action}' на форуме.")
+                        update_moderation_action(conn, item_id, status='done')
+                        await report_forum_job_progress(bot, chat_id, status_message_id,
+                                                        done_text or f"✅ Иск #{case_id}: действие '{action}' выполнено.")
+                    except Exception as e:
+                        logger.error(f"Ошибка модерации '{action}' для иска #{case_id}: {e}", exc_info=True)
+                        update_moderation_action(conn, item_id, status='failed', error=str(e))
+                        await report_forum_job_progress(bot, chat_id, status_message_id,
+                                                        f"❌ Иск #{case_id}: ответ опубликован, но произошла ошибка модерации: {e}\n\nПожалуйста, проверьте тему вручную.")
+                    processed += 1
+
+    logger.info(f"Пакет модерации обработан: {processed} действий за одну сессию владельца.")
+    return processed
+
+async def moderation_worker(application: Application) -> None:
+    """Ждет действий модерации, дает им накопиться и разбирает очередь одним проходом."""
+    conn = application.bot_data['db_connection']
+    wakeup = application.bot_data['moderation_wakeup']
+    logger.info("Воркер пакетной модерации запущен.")
+    while True:
+        wakeup.clear()
+        if not fetch_queued_moderation_actions(conn):
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=FORUM_JOBS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await asyncio.sleep(MODERATION_BATCH_WINDOW_SECONDS)
+        try:
+            await run_moderation_pass(application)
+        except Exception as e:
+            logger.error(f"Ошибка во время прохода модерации: {e}", exc_info=True)
+# --- Конец пакетной модерации владельца ---
+
+# --- Очередь уведомлений скрапера ---
+# sender.py кладет уведомления о новых исках и ответах в Notification_Outbox в той же
+# транзакции, что и сами данные; бот разбирает очередь и рассылает сообщения.
+# Первое уведомление всплеска уходит сразу; следующие, пришедшие в пределах окна
+# outbox.DIGEST_WINDOW_SECONDS, склеиваются в дайджест и уходят по окончании окна.
+# Уведомление, прерванное падением бота, после перезапуска отправляется повторно -
+# только тем получателям, которым оно еще не доставлено (Notification_Deliveries).
+async def notification_outbox_worker(application: Application) -> None:
+    conn = application.bot_data['db_connection']
+    sender = application.bot_data['notification_sender']
+    last_sent_at = {} # (тип, получатель) -> time.monotonic() последней отправки
+    logger.info("Воркер очереди уведомлений запущен.")
+    while True:
+        try:
+            now = time.monotonic()
+            # Отметки старше окна больше ничего не задерживают
+            last_sent_at = {key: sent_at for key, sent_at in last_sent_at.items()
+                            if now - sent_at < outbox.DIGEST_WINDOW_SECONDS}
+            groups = outbox.group_notifications(outbox.fetch_pending_notifications(conn, limit=NOTIFICATION_OUTBOX_BATCH_SIZE))
+            for notification_ids, notification_type, target_user_id, items in outbox.select_ready_groups(groups, last_sent_at, now):
+                last_sent_at[(notification_type, target_user_id)] = now
+                outbox.mark_notifications(conn, notification_ids, 'sending')
+                message = notifier.format_digest(notification_type, items)
+                if len(items) > 1:
+                    logger.info(f"Дайджест '{notification_type}' из {len(items)} уведомлений (ID {notification_ids}).")
+                try:
+                    _, fail_count = await sender.send_notification(conn, message, target_user_id, notification_ids)
+                except Exception as e:
+                    logger.error(f"Не удалось отправить уведомления {notification_ids}: {e}", exc_info=True)
+                    outbox.mark_notifications(conn, notification_ids, 'failed', str(e))
+                    continue
+                outbox.mark_notifications(conn, notification_ids, 'sent', f"Ошибок доставки: {fail_count}" if fail_count else None)
+        except Exception as e:
+            logger.error(f"Ошибка в воркере очереди уведомлений: {e}", exc_info=True)
+        await asyncio.sleep(NOTIFICATION_OUTBOX_POLL_SECONDS)
+# --- Конец очереди уведомлений скрапера ---
+
 # --- Обработчик команды /details ---
 async def details_case_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -1951,7 +2680,7 @@ async def close_case_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 f"Он находится в статусе: \"{status_a_desc}\"✨"
             )
             return
-        elif db_status in ('c', 'd', 'e', 'g'):
+        elif db_status in FINAL_CASE_STATUSES:
             # Для этих статусов можно также получить описание из Helper_DB, если нужно
             # Но по диаграмме сообщение фиксированное для них
             status_desc = db_status
@@ -2389,6 +3118,149 @@ async def remove_judge_command(update: Update, context: ContextTypes.DEFAULT_TYP
 # --- Конец команды /removej ---
 
 # --- Начало команды /broadcast ---
+# Рассылка выполняется фоновой задачей: обработчик команды только создает ее.
+# Каждый получатель отмечается в Broadcast_Recipients_DB сразу после отправки, поэтому
+# после перезапуска бота рассылка продолжается с тех, кому сообщение еще не ушло.
+def create_broadcast(conn: sqlite3.Connection, admin_tg_user_id: int, chat_id: int, status_message_id: int, text: str) -> tuple[int, int]:
+    """Создает рассылку и список получателей. Возвращает (ID рассылки, число получателей)."""
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"INSERT INTO {BROADCASTS_TABLE_NAME} (admin_tg_user_id, chat_id, status_message_id, text) VALUES (?, ?, ?, ?)",
+            (admin_tg_user_id, chat_id, status_message_id, text)
+        )
+        broadcast_id = cursor.lastrowid
+        cursor.execute(f"""
+            INSERT INTO {BROADCAST_RECIPIENTS_TABLE_NAME} (broadcast_id, tg_user_id)
+            SELECT ?, tg_user_id FROM {USERS_TABLE_NAME} WHERE COALESCE(bot_blocked, 0) = 0
+        """, (broadcast_id,))
+        recipients_count = cursor.rowcount
+    return broadcast_id, recipients_count
+
+def get_broadcast_counts(conn: sqlite3.Connection, broadcast_id: int) -> dict:
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT status, COUNT(*) FROM {BROADCAST_RECIPIENTS_TABLE_NAME} WHERE broadcast_id = ? GROUP BY status",
+                   (broadcast_id,))
+    return dict(cursor.fetchall())
+
+def format_broadcast_report(counts: dict, state: str) -> str:
+    """state: running / done / failed."""
+    total = sum(counts.values())
+    done = total - counts.get('pending', 0)
+    headers = {
+        'running': f"Рассылка идет: {done} из {total}...",
+        'done': "Рассылка завершена.",
+        'failed': f"Рассылка прервана ошибкой после {done} из {total}. Подробности в логах.",
+    }
+    return (
+        f"📊 Отчет о рассылке\n\n"
+        f"{headers[state]}\n"
+        f"✅ Успешно отправлено: {counts.get('sent', 0)}\n"
+        f"❌ Не удалось отправить: {counts.get('failed', 0)}\n"
+        f"🚫 Заблокировали бота: {counts.get('blocked', 0)}\n"
+        f"🌀 Всего пользователей: {total}"
+    )
+
+async def run_broadcast(application: Application, broadcast_id: int) -> None:
+    conn = application.bot_data['db_connection']
+    bot = application.bot
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT chat_id, status_message_id, text FROM {BROADCASTS_TABLE_NAME} WHERE id = ?", (broadcast_id,))
+    chat_id, status_message_id, text = cursor.fetchone()
+    cursor.execute(f"SELECT tg_user_id FROM {BROADCAST_RECIPIENTS_TABLE_NAME} WHERE broadcast_id = ? AND status = 'pending'",
+                   (broadcast_id,))
+    pending_users = [row[0] for row in cursor.fetchall()]
+    logger.info(f"Рассылка #{broadcast_id}: осталось отправить {len(pending_users)} пользователям.")
+
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    def mark_recipient(user_id, status, error=None):
+        try:
+            conn.execute(f"UPDATE {BROADCAST_RECIPIENTS_TABLE_NAME} SET status = ?, error = ? WHERE broadcast_id = ? AND tg_user_id = ?",
+                         (status, error, broadcast_id, user_id))
+            if status == 'blocked':
+                conn.execute(f"UPDATE {USERS_TABLE_NAME} SET bot_blocked = 1 WHERE tg_user_id = ?", (user_id,))
+            conn.commit()
+        except sqlite3.Error as e:
+            # Получатель останется 'pending': при возобновлении ему, возможно, придет повтор - это лучше, чем потерять рассылку
+            logger.error(f"Рассылка #{broadcast_id}: не удалось отметить пользователя {user_id} ({status}): {e}")
+
+    async def deliver(user_id):
+        async with semaphore:
+            error = None
+            for _ in range(BROADCAST_MAX_ATTEMPTS):
+                try:
+                    # Приоритет рассылки ниже статусных сообщений: судьи не ждут, пока она закончится
+                    await bot.send_message(chat_id=user_id, text=text, parse_mode='HTML', # Позволяет админу использовать HTML-теги
+                                           rate_limit_args={'priority': PRIORITY_BROADCAST})
+                    mark_recipient(user_id, 'sent')
+                    return
+                except RetryAfter as e:
+                    # Планировщик уже выдержал паузу и повторил запрос - пробуем еще раз
+                    logger.warning(f"Рассылка #{broadcast_id}: RetryAfter {e.retry_after} для пользователя {user_id}.")
+                    error = str(e)
+                except Forbidden:
+                    # Пользователь заблокировал бота - больше ему не пишем
+                    logger.warning(f"Не удалось отправить сообщение пользователю {user_id}: бот заблокирован.")
+                    mark_recipient(user_id, 'blocked', "Forbidden")
+                    return
+                except BadRequest as e:
+                    logger.error(f"Не удалось отправить сообщение пользователю {user_id}: ошибка запроса - {e}")
+                    mark_recipient(user_id, 'failed', str(e))
+                    return
+                except Exception as e:
+                    logger.error(f"Не удалось отправить сообщение пользователю {user_id}: непредвиденная ошибка - {e}")
+                    error = str(e)
+                    await asyncio.sleep(1) # Сетевые сбои: небольшая пауза перед повтором
+            mark_recipient(user_id, 'failed', error)
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL_SECONDS)
+            try:
+                await report_forum_job_progress(bot, chat_id, status_message_id,
+                                                format_broadcast_report(get_broadcast_counts(conn, broadcast_id), 'running'))
+            except Exception as e:
+                logger.warning(f"Рассылка #{broadcast_id}: не удалось обновить прогресс: {e}")
+
+    progress_task = asyncio.create_task(report_progress())
+    final_state = 'failed'
+    try:
+        await asyncio.gather(*(deliver(user_id) for user_id in pending_users))
+        final_state = 'done'
+    except asyncio.CancelledError:
+        # Остановка бота: рассылка остается 'running' и продолжится при следующем запуске
+        final_state = None
+        raise
+    except Exception as e:
+        logger.error(f"Рассылка #{broadcast_id} прервана ошибкой: {e}", exc_info=True)
+    finally:
+        progress_task.cancel()
+        if final_state:
+            try:
+                conn.execute(f"UPDATE {BROADCASTS_TABLE_NAME} SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+                             (final_state, broadcast_id))
+                conn.commit()
+                counts = get_broadcast_counts(conn, broadcast_id)
+                logger.info(f"Рассылка #{broadcast_id} завершена ({final_state}): {counts}")
+                await report_forum_job_progress(bot, chat_id, status_message_id, format_broadcast_report(counts, final_state))
+            except Exception as e:
+                logger.error(f"Рассылка #{broadcast_id}: не удалось записать итог: {e}", exc_info=True)
+
+def start_broadcast_task(application: Application, broadcast_id: int) -> None:
+    broadcast_tasks = application.bot_data.setdefault('broadcast_tasks', {})
+    task = asyncio.create_task(run_broadcast(application, broadcast_id))
+    broadcast_tasks[broadcast_id] = task
+    task.add_done_callback(lambda _: broadcast_tasks.pop(broadcast_id, None))
+
+def resume_broadcasts(application: Application) -> None:
+    """Продолжает рассылки, прерванные остановкой бота."""
+    cursor = application.bot_data['db_connection'].cursor()
+    cursor.execute(f"SELECT id FROM {BROADCASTS_TABLE_NAME} WHERE status = 'running' ORDER BY id ASC")
+    for (broadcast_id,) in cursor.fetchall():
+        logger.info(f"Продолжаю прерванную рассылку #{broadcast_id}.")
+        start_broadcast_task(application, broadcast_id)
+
 async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обрабатывает команду /broadcast <сообщение> для рассылки всем пользователям.
@@ -2420,56 +3292,16 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     logger.info(f"Администратор {user_nick_name} начал рассылку с текстом: '{broadcast_message}'")
-    await update.message.reply_text("✅ Начинаю рассылку. Это может занять некоторое время...")
+    status_message = await update.message.reply_text("✅ Начинаю рассылку. Прогресс будет обновляться в этом сообщении...")
 
-    cursor = conn.cursor()
     try:
-        # 3. Получение списка всех пользователей
-        cursor.execute(f"SELECT tg_user_id FROM {USERS_TABLE_NAME}")
-        all_users = cursor.fetchall()
-
-        if not all_users:
-            await update.message.reply_text("В базе данных нет пользователей для рассылки.")
+        # 3. Рассылка с получателями сохраняется в БД и уходит в фоновую задачу
+        broadcast_id, recipients_count = create_broadcast(conn, tg_user_id, status_message.chat_id,
+                                                          status_message.message_id, broadcast_message)
+        if not recipients_count:
+            await status_message.edit_text("В базе данных нет пользователей для рассылки.")
             return
-
-        # 4. Цикл рассылки с защитой от ошибок и лимитов
-        success_count = 0
-        fail_count = 0
-
-        for user_tuple in all_users:
-            user_id = user_tuple[0]
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=broadcast_message,
-                    parse_mode='HTML' # Позволяет админу использовать HTML-теги
-                )
-                success_count += 1
-            except Forbidden:
-                # Пользователь заблокировал бота
-                logger.warning(f"Не удалось отправить сообщение пользователю {user_id}: бот заблокирован.")
-                fail_count += 1
-            except BadRequest as e:
-                # Ошибка в запросе (например, неверный ID или другая проблема)
-                logger.error(f"Не удалось отправить сообщение пользователю {user_id}: ошибка запроса - {e}")
-                fail_count += 1
-            except Exception as e:
-                # Любая другая непредвиденная ошибка
-                logger.error(f"Не удалось отправить сообщение пользователю {user_id}: непредвиденная ошибка - {e}")
-                fail_count += 1
-            
-            # ЗАЩИТА ОТ ЛИМИТОВ TELEGRAM: делаем небольшую паузу
-            await asyncio.sleep(0.1) # Пауза в 0.1 секунды (10 сообщений/сек)
-
-        # 5. Отправка отчета администратору
-        report_message = (
-            f"📊 **Отчет о рассылке**\n\n"
-            f"Рассылка завершена.\n"
-            f"✅ Успешно отправлено: {success_count}\n"
-            f"❌ Не удалось отправить: {fail_count}\n"
-            f"🌀 Всего пользователей: {len(all_users)}"
-        )
-        await update.message.reply_text(report_message)
+        start_broadcast_task(context.application, broadcast_id)
 
     except sqlite3.Error as e_sql:
         logger.error(f"Ошибка SQL при выполнении /broadcast для администратора {user_nick_name}: {e_sql}")
@@ -2771,30 +3603,79 @@ async def init_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 # --- Другие обработчики команд ---
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
+    # Пользователь снова написал боту - значит, разблокировал его: возвращаем в рассылки
+    conn = context.bot_data['db_connection']
+    conn.execute(f"UPDATE {USERS_TABLE_NAME} SET bot_blocked = 0 WHERE tg_user_id = ? AND bot_blocked = 1", (user.id,))
+    conn.commit()
     await update.message.reply_html(
         rf"Привет, {user.mention_html()}! Используйте /auth для авторизации.",
     )
 
 async def check_driver_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    global selenium_driver
-    if selenium_driver:
+    status_lines = []
+    for worker in browser_pool.all_workers:
+        if not worker.is_running:
+            status_lines.append(f"[{worker.name}] не активен.")
+            continue
+        if worker.lock.locked():
+            # Занятый экземпляр не трогаем: обращение к нему вклинилось бы в чужой воркфлоу
+            status_lines.append(f"[{worker.name}] активен (занят, аккаунт: {worker.account}).")
+            continue
         try:
-            current_url = selenium_driver.current_url
-            await update.message.reply_text(f"Selenium WebDriver активен. Текущий URL: {current_url}")
+            async with worker.lock:
+                current_url = await current_url_perform(worker)
+            status_lines.append(f"[{worker.name}] активен (свободен, аккаунт: {worker.account}). Текущий URL: {current_url}")
         except Exception as e:
-            await update.message.reply_text(f"Selenium WebDriver запущен, но возникла ошибка при доступе: {e}")
-    else:
-        await update.message.reply_text("Selenium WebDriver не активен.")
+            status_lines.append(f"[{worker.name}] запущен, но возникла ошибка при доступе: {e}")
+    depth_by_priority = outbound_scheduler.depth_by_priority()
+    status_lines.append(
+        f"Очередь исходящих сообщений: {outbound_scheduler.depth} (статусы {depth_by_priority[PRIORITY_STATUS]}, "
+        f"уведомления {depth_by_priority[PRIORITY_NOTIFICATION]}, рассылки {depth_by_priority[PRIORITY_BROADCAST]}; "
+        f"максимум {outbound_scheduler.max_depth})"
+    )
+    await update.message.reply_text("Selenium WebDriver:\n" + "\n".join(status_lines))
 
 # --- Функции жизненного цикла приложения ---
 async def post_application_init(application: Application) -> None:
     db_conn = setup_database()
     application.bot_data['db_connection'] = db_conn
     logger.info(f"Соединение с БД {DB_NAME} установлено и сохранено в bot_data.")
-    setup_selenium_driver()
+    await browser_pool.start()
+    application.bot_data['browser_health_task'] = asyncio.create_task(browser_pool.health_check_loop(db_conn))
+
+    recover_forum_jobs(db_conn)
+    recover_moderation_actions(db_conn)
+    application.bot_data['forum_jobs_wakeup'] = asyncio.Event()
+    application.bot_data['moderation_wakeup'] = asyncio.Event()
+    application.bot_data['forum_jobs_task'] = asyncio.create_task(forum_job_worker(application))
+    application.bot_data['moderation_task'] = asyncio.create_task(moderation_worker(application))
+
+    outbox.recover_notifications(db_conn)
+    # Уведомления скрапера идут тем же токеном - через тот же планировщик, что и запросы бота
+    application.bot_data['notification_sender'] = notifier.TelegramSender(scheduler=outbound_scheduler)
+    application.bot_data['notification_outbox_task'] = asyncio.create_task(notification_outbox_worker(application))
+    resume_broadcasts(application)
 
 async def post_application_shutdown(application: Application) -> None:
-    close_selenium_driver()
+    for task_key in ('forum_jobs_task', 'moderation_task', 'notification_outbox_task'):
+        background_task = application.bot_data.get(task_key)
+        if background_task:
+            # Прерванные задачи останутся в статусе 'running' и будут возвращены в очередь при запуске
+            background_task.cancel()
+            try:
+                await background_task
+            except asyncio.CancelledError:
+                pass
+    # Незавершенные рассылки остаются в статусе 'running' и продолжатся при следующем запуске
+    for broadcast_task in list(application.bot_data.get('broadcast_tasks', {}).values()):
+        broadcast_task.cancel()
+    notification_sender = application.bot_data.get('notification_sender')
+    if notification_sender:
+        await notification_sender.close()
+    browser_health_task = application.bot_data.get('browser_health_task')
+    if browser_health_task:
+        browser_health_task.cancel()
+    await browser_pool.stop()
     db_conn = application.bot_data.get('db_connection')
     if db_conn:
         logger.info("Закрытие соединения с БД...")
@@ -2815,6 +3696,7 @@ def main() -> None:
         .token(TELEGRAM_BOT_TOKEN)
         .post_init(post_application_init)
         .post_shutdown(post_application_shutdown) 
+        .rate_limiter(SchedulerRateLimiter(outbound_scheduler))
         .build()
     )
     
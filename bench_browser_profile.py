@@ -0,0 +1,61 @@
+"""
+Замер облегченного профиля браузера: время загрузки страниц и память Chrome
+в обычном и облегченном (FORUMNIK_LEAN_BROWSER=1) режимах.
+
+Запуск: python bench_browser_profile.py [число_загрузок] [url ...]
+Для замера памяти нужен psutil (pip install psutil); без него выводится только время.
+"""
+import sys
+import time
+import statistics
+
+from sender import setup_driver, FORUM_URL
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def browser_rss_mb(driver):
+    """Суммарная память (RSS) chromedriver и всех процессов Chrome, запущенных им."""
+    if psutil is None: return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+        return sum(process.memory_info().rss for process in processes) / (1024 * 1024)
+    except psutil.Error:
+        return None
+
+def measure_profile(lean, urls, loads):
+    driver = setup_driver(lean=lean)
+    try:
+        driver.get(urls[0]) # Прогрев: первая загрузка включает DNS и TLS
+        timings = []
+        for _ in range(loads):
+            for url in urls:
+                started = time.perf_counter()
+                driver.get(url)
+                timings.append(time.perf_counter() - started)
+        return timings, browser_rss_mb(driver)
+    finally:
+        driver.quit()
+
+if __name__ == "__main__":
+    loads = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    urls = sys.argv[2:] or [FORUM_URL]
+    results = {}
+    for lean in (False, True):
+        name = "облегченный" if lean else "обычный"
+        print(f"Замеряю {name} профиль ({loads} x {len(urls)} загрузок)...")
+        results[name] = measure_profile(lean, urls, loads)
+
+    print("\nПрофиль       | медиана, с | среднее, с | RSS, МБ")
+    for name, (timings, rss) in results.items():
+        rss_text = f"{rss:.0f}" if rss is not None else "н/д"
+        print(f"{name:<13} | {statistics.median(timings):>10.2f} | {statistics.mean(timings):>10.2f} | {rss_text}")
+    (before, before_rss), (after, after_rss) = results["обычный"], results["облегченный"]
+    print(f"\nДо/после: медиана {statistics.median(before):.2f} -> {statistics.median(after):.2f} с "
+          f"({statistics.median(before) / statistics.median(after):.1f}x)", end="")
+    if before_rss and after_rss: print(f", RSS {before_rss:.0f} -> {after_rss:.0f} МБ")
+    else: print()
+    if psutil is None: print("\npsutil не установлен - память не измерялась.")
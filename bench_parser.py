@@ -0,0 +1,96 @@
+"""
+Замер разбора первого поста: прежний путь (html.parser, innerHTML разбирается дважды -
+для текста и для ссылок) против нового (HTML_PARSER, один разбор через parse_post_html).
+
+Запуск:
+    python bench_parser.py --capture https://forum.arizona-rp.com/threads/...   # сохранить страницы тем
+    python bench_parser.py bench_pages/*.html -n 200                            # замер по сохраненным страницам
+
+Последний замер (страница темы в разметке XenForo, 60 КБ: первый пост и 20 ответов; 1 CPU, разброс по 3-4 запускам):
+    новый путь на lxml:        пост 2.2-2.7 -> 1.1-1.3 мс, страница 35-50 -> 20-30 мс (в 1.5-1.8 раза быстрее)
+    новый путь на html.parser: пост 2.1-2.4 -> 0.8-1.5 мс, страница 40-47 -> 32-43 мс (в 1.1-1.4 раза быстрее)
+"""
+import io
+import os
+import sys
+import argparse
+import timeit
+from contextlib import redirect_stdout
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+from sender import (HTML_PARSER, USER_AGENT, HTTP_TIMEOUT_SECONDS, FIRST_POST_ARTICLE_SELECTOR,
+                    MESSAGE_MAIN_CELL_SELECTOR, POST_TEXT_SELECTOR, IGNORED_MEDIA_URLS,
+                    parse_post_text_details, parse_post_html, parse_topic_details, thread_id_from_url)
+
+CAPTURE_DIR = "bench_pages"
+
+def capture_pages(urls):
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    for url in urls:
+        response = session.get(url, timeout=HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        path = os.path.join(CAPTURE_DIR, f"{thread_id_from_url(url) or len(os.listdir(CAPTURE_DIR))}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"<!-- {url} -->\n{response.text}")
+        print(f"Сохранено: {path}")
+
+def first_post_html(page_html):
+    soup = BeautifulSoup(page_html, 'html.parser')
+    return soup.select_one(FIRST_POST_ARTICLE_SELECTOR).select_one(MESSAGE_MAIN_CELL_SELECTOR).select_one(POST_TEXT_SELECTOR).decode_contents()
+
+def legacy_parse_post_html(html_content, base_url):
+    """Прежняя схема из get_topic_details + extract_media_links_from_html."""
+    plain_text = BeautifulSoup(html_content, 'html.parser').get_text(separator='\n', strip=True)
+    parsed_details = parse_post_text_details(plain_text)
+    links = set()
+    for a_tag in BeautifulSoup(html_content, 'html.parser').find_all('a', href=True):
+        href = a_tag['href']
+        if href and href.strip().lower() not in IGNORED_MEDIA_URLS and '#' not in href:
+            if href.startswith('http://') or href.startswith('https://'):
+                links.add(href.strip())
+            elif not href.startswith(('mailto:', 'tel:')):
+                links.add(urljoin(base_url, href.strip()))
+    return plain_text, parsed_details, sorted(links)
+
+def legacy_parse_topic_page(page_html, base_url):
+    return legacy_parse_post_html(first_post_html(page_html), base_url)
+
+def measure(func, args, number):
+    with redirect_stdout(io.StringIO()): # parse_post_text_details подробно печатает каждый разбор
+        return min(timeit.repeat(lambda: func(*args), number=number, repeat=3)) / number * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер парсеров поста")
+    parser.add_argument("files", nargs="*", help="сохраненные HTML-страницы тем")
+    parser.add_argument("--capture", nargs="+", metavar="URL", help="скачать страницы тем в bench_pages/")
+    parser.add_argument("-n", type=int, default=100, help="число повторов на страницу")
+    args = parser.parse_args()
+
+    if args.capture:
+        capture_pages(args.capture)
+        sys.exit(0)
+    if not args.files:
+        parser.error("укажите сохраненные страницы или --capture URL")
+
+    print(f"Новый путь использует парсер: {HTML_PARSER}")
+    print("Файл                         | пост: было, мс | пост: стало, мс | страница: было, мс | страница: стало, мс")
+    for path in args.files:
+        with open(path, encoding='utf-8') as f:
+            page_html = f.read()
+        base_url = "https://forum.arizona-rp.com/"
+        post_html = first_post_html(page_html)
+        # Результаты обоих путей должны совпадать, иначе сравнение не имеет смысла
+        with redirect_stdout(io.StringIO()):
+            same_result = legacy_parse_post_html(post_html, base_url) == parse_post_html(post_html, base_url)
+        if not same_result:
+            print(f"ВНИМАНИЕ: {path}: результаты старого и нового разбора отличаются")
+        print(f"{os.path.basename(path):<28} | "
+              f"{measure(legacy_parse_post_html, (post_html, base_url), args.n):>14.3f} | "
+              f"{measure(parse_post_html, (post_html, base_url), args.n):>15.3f} | "
+              f"{measure(legacy_parse_topic_page, (page_html, base_url), args.n):>18.3f} | "
+              f"{measure(parse_topic_details, (page_html, base_url), args.n):>19.3f}")
@@ -0,0 +1,8 @@
+"""
+Статусы исков в Cases_DB, общие для бота (TGBot.py) и скрапера (sender.py).
+Только стандартная библиотека - модуль импортируют оба процесса.
+"""
+
+# Завершающие статусы: отклонения ('c', 'd', 'e') и закрытие после рассмотрения ('g').
+# Тема иска в них уже закрыта, и статус больше не меняется
+FINAL_CASE_STATUSES = ('c', 'd', 'e', 'g')
@@ -0,0 +1,205 @@
+import re
+import logging
+
+import requests
+
+# --- Настройки ---
+FORUM_BASE_URL = "https://forum.arizona-rp.com/"
+LOGIN_URL = FORUM_BASE_URL + "login/"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36"
+REQUEST_TIMEOUT_SECONDS = 15
+
+# --- Регулярные выражения для разметки XenForo ---
+CSRF_PATTERN = re.compile(r'data-csrf="([^"]+)"')
+XF_TOKEN_PATTERN = re.compile(r'name="_xfToken"\s+value="([^"]+)"')
+LOGGED_IN_PATTERN = re.compile(r'data-logged-in="true"')
+# Ссылка на тему без номера страницы и якоря поста: .../threads/slug.12345/
+THREAD_URL_PATTERN = re.compile(r"^(.*?/threads/[^/]+\.\d+/)")
+
+logger = logging.getLogger(__name__)
+
+
+class ForumHttpError(Exception):
+    """Форум вернул ошибку или неожиданную страницу."""
+
+
+class ForumHttpUnknownResult(ForumHttpError):
+    """Запрос был отправлен, но ответ не получен: действие могло выполниться на форуме."""
+
+
+class ForumHttpRejected(ForumHttpError):
+    """Форум разобрал запрос и явно отказал (JSON со status: error): действие не выполнено."""
+
+
+class ForumHttpClient:
+    """
+    Клиент форума XenForo поверх requests.Session: вход, публикация ответа,
+    закрепление и закрытие тем без браузера. Один клиент = один аккаунт.
+    Клиент не потокобезопасен - действия одного аккаунта выполняются последовательно.
+    """
+    def __init__(self, base_url: str = FORUM_BASE_URL):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+        self.csrf_token = None
+        self.action_posted = False # Был ли в текущем perform() отправлен POST-запрос действия
+
+    # --- Cookies (совместимы с форматом Selenium driver.get_cookies()) ---
+    def load_cookies(self, cookies: list):
+        self.session.cookies.clear()
+        for cookie in cookies or []:
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain'), path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False), expires=cookie.get('expiry')
+            )
+
+    def export_cookies(self) -> list:
+        exported = []
+        for cookie in self.session.cookies:
+            item = {'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain,
+                    'path': cookie.path, 'secure': cookie.secure}
+            if cookie.expires:
+                item['expiry'] = cookie.expires
+            exported.append(item)
+        return exported
+
+    # --- Низкоуровневые запросы ---
+    def _get(self, url: str) -> str:
+        response = self.session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        self._remember_csrf(response.text)
+        return response.text
+
+    def _remember_csrf(self, page_html: str):
+        match = CSRF_PATTERN.search(page_html) or XF_TOKEN_PATTERN.search(page_html)
+        if match:
+            self.csrf_token = match.group(1)
+
+    def _post_json(self, url: str, data: dict) -> dict:
+        if not self.csrf_token:
+            raise ForumHttpError("Не найден _xfToken: сначала нужно открыть страницу форума.")
+        payload = dict(data, _xfToken=self.csrf_token, _xfResponseType='json', _xfWithData='1')
+        self.action_posted = True
+        try:
+            response = self.session.post(url, data=payload, timeout=REQUEST_TIMEOUT_SECONDS)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise ForumHttpUnknownResult(f"Нет ответа от форума на {url}: {e}")
+        # Запрос ушел: кроме явного отказа XenForo, любой сбой означает, что результат неизвестен
+        # (например, 502/504 от прокси, когда форум уже сохранил сообщение)
+        try:
+            result = response.json()
+        except ValueError:
+            raise ForumHttpUnknownResult(f"Форум вернул не JSON (HTTP {response.status_code}) на {url}.")
+        if result.get('status') == 'error':
+            raise ForumHttpRejected(f"Форум вернул ошибку: {result.get('errors') or result}")
+        if not response.ok or result.get('status') != 'ok':
+            raise ForumHttpUnknownResult(f"Неожиданный ответ форума (HTTP {response.status_code}) на {url}: {result}")
+        return result
+
+    @staticmethod
+    def is_logged_in(page_html: str) -> bool:
+        return bool(LOGGED_IN_PATTERN.search(page_html))
+
+    @staticmethod
+    def thread_base_url(topic_url: str) -> str:
+        match = THREAD_URL_PATTERN.match(topic_url)
+        if not match:
+            raise ForumHttpError(f"Не удалось определить адрес темы: {topic_url}")
+        return match.group(1)
+
+    @staticmethod
+    def _menu_link_text(page_html: str, action_path: str) -> str | None:
+        """Текст пункта меню инструментов темы (например, 'Закрепить тему' для quick-stick)."""
+        match = re.search(rf'href="[^"]*/{action_path}"[^>]*>\s*([^<]+?)\s*<', page_html)
+        return match.group(1) if match else None
+
+    # --- Вход ---
+    def login(self, nick_name: str, password: str) -> bool:
+        logger.info(f"HTTP: вход на форум под аккаунтом '{nick_name}'...")
+        self.session.cookies.clear()
+        self._get(LOGIN_URL)
+        response = self.session.post(LOGIN_URL + "login", data={
+            'login': nick_name,
+            'password': password,
+            'remember': '1',
+            '_xfToken': self.csrf_token,
+            '_xfRedirect': self.base_url,
+        }, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        self._remember_csrf(response.text)
+        if not self.is_logged_in(response.text):
+            logger.error(f"HTTP: не удалось войти под аккаунтом '{nick_name}'.")
+            return False
+        logger.info(f"HTTP: вход под аккаунтом '{nick_name}' выполнен.")
+        return True
+
+    def open_thread(self, topic_url: str, nick_name: str, password: str) -> str:
+        """Открывает тему от имени аккаунта; при истекшей сессии выполняет вход и повторяет запрос."""
+        thread_url = self.thread_base_url(topic_url)
+        page_html = self._get(thread_url)
+        if not self.is_logged_in(page_html):
+            if not self.login(nick_name, password):
+                raise ForumHttpError(f"Не удалось войти под аккаунтом '{nick_name}'.")
+            page_html = self._get(thread_url)
+        return page_html
+
+    # --- Действия ---
+    def post_reply(self, topic_url: str, reply_text: str, nick_name: str, password: str) -> bool:
+        self.open_thread(topic_url, nick_name, password)
+        self._post_json(self.thread_base_url(topic_url) + "add-reply", {'message': reply_text})
+        logger.info(f"HTTP: ответ опубликован в теме {topic_url}.")
+        return True
+
+    def _toggle(self, topic_url: str, action_path: str):
+        self._post_json(self.thread_base_url(topic_url) + action_path, {})
+
+    def set_sticky(self, topic_url: str, sticky: bool, nick_name: str, password: str) -> bool:
+        page_html = self.open_thread(topic_url, nick_name, password)
+        link_text = self._menu_link_text(page_html, "quick-stick")
+        if link_text is None:
+            raise ForumHttpError("В меню темы нет пункта закрепления (нет прав модератора?).")
+        is_sticky = link_text.startswith("Открепить")
+        if is_sticky != sticky:
+            self._toggle(topic_url, "quick-stick")
+        logger.info(f"HTTP: тема {topic_url} {'закреплена' if sticky else 'откреплена'}.")
+        return True
+
+    def close_thread(self, topic_url: str, nick_name: str, password: str) -> bool:
+        # Как и в Selenium-версии: перед закрытием тема открепляется
+        self.set_sticky(topic_url, False, nick_name, password)
+        page_html = self._get(self.thread_base_url(topic_url))
+        link_text = self._menu_link_text(page_html, "quick-close")
+        if link_text is None:
+            raise ForumHttpError("В меню темы нет пункта закрытия (нет прав модератора?).")
+        if not link_text.startswith("Открыть"):
+            self._toggle(topic_url, "quick-close")
+        logger.info(f"HTTP: тема {topic_url} закрыта.")
+        return True
+
+    def perform(self, action: str, topic_url: str, nick_name: str, password: str, reply_text: str = None) -> bool:
+        """
+        Единая точка входа: action = answer / pin / unpin / close.
+        Сбой после отправки POST-запроса (кроме явного отказа форума) пробрасывается как
+        ForumHttpUnknownResult: повторять такое действие другим путем нельзя.
+        """
+        self.action_posted = False
+        try:
+            return self._perform(action, topic_url, nick_name, password, reply_text)
+        except (ForumHttpUnknownResult, ForumHttpRejected):
+            raise
+        except Exception as e:
+            if self.action_posted:
+                raise ForumHttpUnknownResult(f"Сбой после отправки действия '{action}': {e}") from e
+            raise
+
+    def _perform(self, action: str, topic_url: str, nick_name: str, password: str, reply_text: str = None) -> bool:
+        if action == 'answer':
+            return self.post_reply(topic_url, reply_text, nick_name, password)
+        if action == 'pin':
+            return self.set_sticky(topic_url, True, nick_name, password)
+        if action == 'unpin':
+            return self.set_sticky(topic_url, False, nick_name, password)
+        if action == 'close':
+            return self.close_thread(topic_url, nick_name, password)
+        raise ValueError(f"Неизвестное действие: {action}")
@@ -1,11 +1,15 @@
 import sqlite3
-import requests
-import time
+import asyncio
 import sys
 import logging
 import os
 import html # <-- Добавляем необходимый импорт
 
+import httpx
+
+from telegram_outbound import OutboundScheduler, RetryLater, PRIORITY_NOTIFICATION
+from outbox import setup_outbox, get_delivered_chat_ids, record_delivery
+
 # --- Настройки ---
 TOKEN_FROM_ENV = os.environ.get("TELEGRAM_BOT_TOKEN")
 BOT_TOKEN = TOKEN_FROM_ENV if TOKEN_FROM_ENV else "7944979086:AAH-tlkkPLDxMUIwCrcQluIZbSARrCVN_f8"
@@ -13,8 +17,31 @@ BOT_TOKEN = TOKEN_FROM_ENV if TOKEN_FROM_ENV else "7944979086:AAH-tlkkPLDxMUIwCr
 DB_NAME = "forumnik_3_0.db"
 USERS_TABLE_NAME = "Users_DB"
 WHITELIST_TABLE_NAME = "judge_white_list"
+SEND_CONCURRENCY = 10 # Одновременных запросов к Bot API
+SEND_MAX_ATTEMPTS = 3
+SEND_TIMEOUT_SECONDS = 10
+
+logger = logging.getLogger("notifier")
 
-logging.basicConfig(format="%(asctime)s - NOTIFIER - %(levelname)s - %(message)s", level=logging.INFO)
+def format_notification(notification_type, content, item_id):
+    # Формируем сообщение здесь, экранируя переменные части
+    if notification_type == "new_case":
+        return f"📢 Поступил новый иск!\n\n<b>#{item_id}: {html.escape(content)}</b>\n\nИспользуйте <code>/list</code> в боте для просмотра."
+    elif notification_type == "new_reply":
+        return f"🔔 По вашему иску <b>#{item_id}: {html.escape(content)}</b> появился новый ответ! Проверьте форум."
+    return html.escape(content) # По умолчанию просто экранируем
+
+def format_digest(notification_type, items):
+    """Одно сообщение на несколько событий одного типа; для одного события - обычный текст."""
+    if len(items) == 1:
+        content, item_id = items[0]
+        return format_notification(notification_type, content, item_id)
+    lines = "\n".join(f"<b>#{item_id}: {html.escape(content or '')}</b>" for content, item_id in items)
+    if notification_type == "new_case":
+        return f"📢 Поступили новые иски ({len(items)}):\n\n{lines}\n\nИспользуйте <code>/list</code> в боте для просмотра."
+    elif notification_type == "new_reply":
+        return f"🔔 Новые ответы по вашим искам ({len(items)}):\n\n{lines}\n\nПроверьте форум."
+    return "\n\n".join(html.escape(content or '') for content, _ in items)
 
 def get_judge_tg_id(conn, judge_nick_name):
     if not judge_nick_name: return None
@@ -23,56 +50,122 @@ def get_judge_tg_id(conn, judge_nick_name):
     result = cursor.fetchone()
     return result[0] if result else None
 
-def send_notification(message_text, target_user_id=None):
-    if not BOT_TOKEN or "ВАШ" in BOT_TOKEN:
-        logging.error("Токен бота не найден!")
-        return
-
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    user_ids_to_notify = []
+def get_recipients(conn, target_user_id=None):
     if target_user_id:
-        user_ids_to_notify.append(target_user_id)
-    else: 
-        cursor.execute(f"""
-            SELECT u.tg_user_id FROM {USERS_TABLE_NAME} u
-            JOIN {WHITELIST_TABLE_NAME} w ON u.nick_name = w.nick_name
-            WHERE u.authorization = 1
-        """)
-        results = cursor.fetchall()
-        user_ids_to_notify = [row[0] for row in results]
-    
-    conn.close()
-
-    if not user_ids_to_notify:
-        logging.info("Не найдено пользователей для рассылки.")
-        return
-    
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    success_count, fail_count = 0, 0
-
-    logging.info(f"Начинаю рассылку для {len(user_ids_to_notify)} пользователей...")
-    for user_id in user_ids_to_notify:
-        payload = {'chat_id': user_id, 'text': message_text, 'parse_mode': 'HTML'}
-        
-        try:
-            response = requests.post(url, json=payload, timeout=5)
-            if response.status_code == 200:
+        return [int(target_user_id)]
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT u.tg_user_id FROM {USERS_TABLE_NAME} u
+        JOIN {WHITELIST_TABLE_NAME} w ON u.nick_name = w.nick_name
+        WHERE u.authorization = 1
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+# --- Асинхронная отправка ---
+class TelegramSender:
+    """
+    Отправка сообщений через Bot API: один пул соединений httpx на все отправки,
+    параллельные запросы через планировщик исходящих сообщений (см. telegram_outbound.py).
+    Создается внутри работающего event loop и закрывается через close().
+    """
+    def __init__(self, bot_token: str = BOT_TOKEN, concurrency: int = SEND_CONCURRENCY, scheduler: OutboundScheduler = None):
+        self.url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        self.client = httpx.AsyncClient(
+            timeout=SEND_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+        # Планировщик передается снаружи, если тем же токеном пишет кто-то еще (TGBot.py)
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or OutboundScheduler()
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def close(self):
+        if self.owns_scheduler:
+            await self.scheduler.stop()
+        await self.client.aclose()
+
+    async def _post(self, payload):
+        response = await self.client.post(self.url, json=payload)
+        if response.status_code == 429:
+            # Паузу и повтор берет на себя планировщик: он останавливает все отправки бота, а не только эту
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+            except ValueError:
+                retry_after = 1
+            raise RetryLater(retry_after)
+        return response
+
+    async def send_message(self, chat_id, message_text):
+        """Возвращает (статус 'sent'/'failed', число попыток, текст ошибки)."""
+        payload = {'chat_id': chat_id, 'text': message_text, 'parse_mode': 'HTML'}
+        error = None
+        async with self.semaphore:
+            for attempt in range(1, SEND_MAX_ATTEMPTS + 1):
+                try:
+                    response = await self.scheduler.submit(chat_id, lambda: self._post(payload), PRIORITY_NOTIFICATION)
+                except httpx.TransportError as e:
+                    error = f"Сетевая ошибка: {e}"
+                    await asyncio.sleep(attempt)
+                    continue
+                except RetryLater as e:
+                    error = str(e) # Планировщик уже выждал и повторил несколько раз
+                    continue
+                if response.status_code == 200:
+                    return 'sent', attempt, None
+                error = f"HTTP {response.status_code}: {response.text}"
+                if response.status_code >= 500:
+                    await asyncio.sleep(attempt)
+                    continue
+                break # 400/403 и прочее: повтор не поможет (бот заблокирован, чат не найден)
+        return 'failed', attempt, error
+
+    async def send_notification(self, conn, message_text, target_user_id=None, notification_ids=None):
+        if not BOT_TOKEN or "ВАШ" in BOT_TOKEN:
+            logger.error("Токен бота не найден!")
+            return 0, 0
+
+        user_ids_to_notify = get_recipients(conn, target_user_id)
+        if notification_ids:
+            delivered = get_delivered_chat_ids(conn, notification_ids)
+            user_ids_to_notify = [user_id for user_id in user_ids_to_notify if user_id not in delivered]
+
+        if not user_ids_to_notify:
+            logger.info("Не найдено пользователей для рассылки.")
+            return 0, 0
+
+        logger.info(f"Начинаю рассылку для {len(user_ids_to_notify)} пользователей...")
+        success_count, fail_count = 0, 0
+
+        async def deliver(user_id):
+            nonlocal success_count, fail_count
+            status, attempts, error = await self.send_message(user_id, message_text)
+            if status == 'sent':
                 success_count += 1
             else:
-                # Улучшенное логирование
-                logging.warning(f"Ошибка отправки пользователю {user_id}. Статус: {response.status_code}, Ответ: {response.text}")
+                logger.warning(f"Ошибка отправки пользователю {user_id}: {error}")
                 fail_count += 1
-        except Exception as e:
-            logging.error(f"Критическая ошибка при отправке сообщения пользователю {user_id}: {e}")
-            fail_count += 1
-        
-        time.sleep(0.1)
+            # Итог пишется сразу: если процесс упадет посреди рассылки, повтор пропустит уже получивших
+            record_delivery(conn, notification_ids, user_id, status, attempts, error)
+
+        await asyncio.gather(*(deliver(user_id) for user_id in user_ids_to_notify))
+        logger.info(f"Рассылка завершена. Успешно: {success_count}, Ошибки: {fail_count}")
+        return success_count, fail_count
 
-    logging.info(f"Рассылка завершена. Успешно: {success_count}, Ошибки: {fail_count}")
+def send_notification(message_text, target_user_id=None):
+    """Синхронная обертка для запуска из командной строки."""
+    async def run():
+        sender = TelegramSender()
+        conn = sqlite3.connect(DB_NAME)
+        try:
+            setup_outbox(conn)
+            return await sender.send_notification(conn, message_text, target_user_id)
+        finally:
+            conn.close()
+            await sender.close()
+    return asyncio.run(run())
 
 if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - NOTIFIER - %(levelname)s - %(message)s", level=logging.INFO)
     # Аргументы: python notifier.py "Тип уведомления" "Заголовок/текст" "ID" [опционально: tg_user_id]
     if len(sys.argv) > 3:
         notification_type = sys.argv[1]
@@ -80,14 +173,6 @@ if __name__ == "__main__":
         item_id = sys.argv[3]
         target_id = sys.argv[4] if len(sys.argv) > 4 else None
         
-        # Формируем сообщение здесь, экранируя переменные части
-        if notification_type == "new_case":
-            message = f"📢 Поступил новый иск!\n\n<b>#{item_id}: {html.escape(content)}</b>\n\nИспользуйте <code>/list</code> в боте для просмотра."
-        elif notification_type == "new_reply":
-            message = f"🔔 По вашему иску <b>#{item_id}: {html.escape(content)}</b> появился новый ответ! Проверьте форум."
-        else:
-            message = html.escape(content) # По умолчанию просто экранируем
-            
-        send_notification(message, target_id)
+        send_notification(format_notification(notification_type, content, item_id), target_id)
     else:
         print("Ошибка: недостаточно аргументов.")
\ No newline at end of file
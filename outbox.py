@@ -0,0 +1,120 @@
+"""
+Очередь уведомлений (outbox) в общей БД: запись, выборка, отметки доставки и склейка в дайджесты.
+Только sqlite3 и стандартная библиотека - модуль импортирует скрапер (sender.py),
+которому не нужны ни httpx, ни python-telegram-bot. Отправкой занимается notifier.py.
+"""
+import os
+
+# Очередь уведомлений: скрапер пишет сюда в той же транзакции, что и сам иск/ответ,
+# а TGBot.py разбирает очередь и отправляет сообщения
+OUTBOX_TABLE_NAME = "Notification_Outbox"
+# Итог доставки каждому получателю: по нему повторная отправка пропускает тех, кто уже получил
+DELIVERY_TABLE_NAME = "Notification_Deliveries"
+
+# Окно склейки: первое уведомление всплеска уходит сразу, а пришедшие за ним в пределах окна
+# копятся и уходят одним сообщением-дайджестом по окончании окна
+# (новые иски - одним списком всем судьям, новые ответы - одним сообщением на судью). 0 - без склейки
+DIGEST_WINDOW_SECONDS = int(os.environ.get("FORUMNIK_DIGEST_WINDOW_SECONDS", "20"))
+DIGEST_MAX_ITEMS = 20 # Чтобы дайджест гарантированно уложился в лимит 4096 символов на сообщение
+
+def setup_outbox(conn):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {OUTBOX_TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        notification_type TEXT NOT NULL,    -- new_case / new_reply
+        content TEXT,                       -- заголовок темы
+        item_id TEXT,                       -- ID иска
+        target_user_id INTEGER,             -- NULL - всем судьям из белого списка
+        status TEXT NOT NULL DEFAULT 'pending', -- pending / sending / sent / failed
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )""")
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {DELIVERY_TABLE_NAME} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        notification_id INTEGER,            -- NULL - отправка из командной строки
+        chat_id INTEGER NOT NULL,
+        status TEXT NOT NULL,               -- sent / failed
+        attempts INTEGER NOT NULL DEFAULT 1,
+        error TEXT,
+        delivered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_deliveries_notification ON {DELIVERY_TABLE_NAME} (notification_id, status)")
+    conn.commit()
+
+def enqueue_notification(cursor, notification_type, content, item_id, target_user_id=None):
+    """Добавляет уведомление в очередь. Коммит - за вызывающим: запись идет в его транзакции."""
+    cursor.execute(
+        f"INSERT INTO {OUTBOX_TABLE_NAME} (notification_type, content, item_id, target_user_id) VALUES (?, ?, ?, ?)",
+        (notification_type, content, str(item_id), target_user_id)
+    )
+
+def fetch_pending_notifications(conn, limit=50):
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT id, notification_type, content, item_id, target_user_id FROM {OUTBOX_TABLE_NAME}
+        WHERE status = 'pending' ORDER BY id ASC LIMIT ?
+    """, (limit,))
+    return cursor.fetchall()
+
+def mark_notification(conn, notification_id, status, error=None):
+    mark_notifications(conn, [notification_id], status, error)
+
+def mark_notifications(conn, notification_ids, status, error=None):
+    attempts_sql = ", attempts = attempts + 1" if status == 'sending' else ""
+    sent_at_sql = ", sent_at = CURRENT_TIMESTAMP" if status == 'sent' else ""
+    conn.executemany(f"UPDATE {OUTBOX_TABLE_NAME} SET status = ?, error = ?{attempts_sql}{sent_at_sql} WHERE id = ?",
+                     [(status, error, notification_id) for notification_id in notification_ids])
+    conn.commit()
+
+def group_notifications(rows):
+    """
+    Склеивает строки очереди в дайджесты по (тип, получатель) с сохранением порядка.
+    Возвращает список (ids, notification_type, target_user_id, [(content, item_id), ...]).
+    """
+    max_items = DIGEST_MAX_ITEMS if DIGEST_WINDOW_SECONDS > 0 else 1
+    groups, open_groups = [], {}
+    for notification_id, notification_type, content, item_id, target_user_id in rows:
+        key = (notification_type, target_user_id)
+        group = open_groups.get(key)
+        if group is None or len(group[0]) >= max_items:
+            group = open_groups[key] = ([], notification_type, target_user_id, [])
+            groups.append(group)
+        group[0].append(notification_id)
+        group[3].append((content, item_id))
+    return groups
+
+def select_ready_groups(groups, last_sent_at, now, window_seconds=None):
+    """
+    Склейка по переднему фронту: группа (тип, получатель) уходит сразу, если этому получателю
+    уведомления такого типа не отправлялись последние window_seconds; иначе ждет конца окна.
+    last_sent_at - словарь (тип, получатель) -> время последней отправки; обновляет вызывающий.
+    """
+    window_seconds = DIGEST_WINDOW_SECONDS if window_seconds is None else window_seconds
+    return [group for group in groups
+            if now - last_sent_at.get((group[1], group[2]), float('-inf')) >= window_seconds]
+
+def recover_notifications(conn):
+    """Уведомления, отправка которых прервалась падением, возвращаются в очередь."""
+    conn.execute(f"UPDATE {OUTBOX_TABLE_NAME} SET status = 'pending' WHERE status = 'sending'")
+    conn.commit()
+
+def get_delivered_chat_ids(conn, notification_ids):
+    """Получатели, которым уже доставлены все уведомления дайджеста (при повторе после падения им не шлем)."""
+    placeholders = ", ".join("?" for _ in notification_ids)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT chat_id FROM {DELIVERY_TABLE_NAME}
+        WHERE notification_id IN ({placeholders}) AND status = 'sent'
+        GROUP BY chat_id HAVING COUNT(DISTINCT notification_id) = ?
+    """, (*notification_ids, len(set(notification_ids))))
+    return {row[0] for row in cursor.fetchall()}
+
+def record_delivery(conn, notification_ids, chat_id, status, attempts, error=None):
+    conn.executemany(
+        f"INSERT INTO {DELIVERY_TABLE_NAME} (notification_id, chat_id, status, attempts, error) VALUES (?, ?, ?, ?, ?)",
+        [(notification_id, chat_id, status, attempts, error) for notification_id in notification_ids or [None]]
+    )
+    conn.commit()
@@ -0,0 +1,67 @@
+"""
+Повторный разбор архива HTML первых постов (Case_HTML_Archive) текущими парсерами sender.py.
+Обновляет applicant_name, officer_name и media_references в Cases_DB одной пачкой - без обращения к форуму.
+
+Запуск:
+    python reparse_archive.py                  # все иски из архива
+    python reparse_archive.py --only-missing   # только иски без заявителя или ответчика
+    python reparse_archive.py --dry-run        # показать, что изменится, не записывая в БД
+"""
+import io
+import os
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+from sender import DB_NAME, TABLE_NAME, HTML_ARCHIVE_TABLE_NAME, parse_post_html
+
+def reparse_row(row):
+    """Выполняется в отдельном процессе: (case_id, сжатый HTML, ссылка) -> новые значения полей."""
+    case_id, compressed_html, topic_link = row
+    with redirect_stdout(io.StringIO()): # parse_post_text_details подробно печатает каждый разбор
+        _, parsed_details, media_links = parse_post_html(zlib.decompress(compressed_html).decode('utf-8'), topic_link)
+    return (parsed_details.get('applicant'), parsed_details.get('officer'),
+            json.dumps(media_links) if media_links else None, case_id)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Повторный разбор архива HTML исков")
+    parser.add_argument("--only-missing", action="store_true", help="только иски без заявителя или ответчика")
+    parser.add_argument("--dry-run", action="store_true", help="не записывать изменения в БД")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="число процессов")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    query = f"""
+        SELECT a.case_id, a.post_html, a.topic_link, c.applicant_name, c.officer_name, c.media_references
+        FROM {HTML_ARCHIVE_TABLE_NAME} a JOIN {TABLE_NAME} c ON c.id = a.case_id
+    """
+    if args.only_missing:
+        query += " WHERE c.applicant_name IS NULL OR c.officer_name IS NULL"
+    rows = cursor.execute(query).fetchall()
+    print(f"Иск(ов) в архиве для разбора: {len(rows)}")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = list(executor.map(reparse_row, [row[:3] for row in rows], chunksize=50))
+    print(f"Разбор занял {time.perf_counter() - started:.2f} с ({args.workers} процессов).")
+
+    current_values = {row[0]: row[3:] for row in rows}
+    changed = [result for result in results if tuple(result[:3]) != tuple(current_values[result[3]])]
+    print(f"Изменится иск(ов): {len(changed)}")
+    for applicant, officer, _, case_id in changed[:20]:
+        old_applicant, old_officer, _ = current_values[case_id]
+        print(f"  #{case_id}: заявитель {old_applicant!r} -> {applicant!r}, ответчик {old_officer!r} -> {officer!r}")
+
+    if changed and not args.dry_run:
+        with conn:
+            cursor.executemany(
+                f"UPDATE {TABLE_NAME} SET applicant_name = ?, officer_name = ?, media_references = ? WHERE id = ?",
+                changed
+            )
+        print("Изменения записаны в БД.")
+    conn.close()
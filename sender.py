@@ -3,8 +3,17 @@ import re
 import sqlite3 
 import json 
 import os
-import subprocess
-from bs4 import BeautifulSoup 
+import zlib
+import io
+import hashlib
+import random
+import threading
+import queue
+from collections import deque
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bs4 import BeautifulSoup, SoupStrainer
+from PIL import Image
 from datetime import datetime 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -12,18 +21,75 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import StaleElementReferenceException
 from webdriver_manager.chrome import ChromeDriverManager
 from urllib.parse import urljoin 
+from outbox import setup_outbox, enqueue_notification
+from case_status import FINAL_CASE_STATUSES
 import html
+import xml.etree.ElementTree as ET
+
+# Быстрый парсер lxml (pip install lxml), если установлен; иначе встроенный html.parser
+try:
+    import lxml # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+# Страницы тем разбираются только в пределах постов - остальная разметка форума не строится
+POSTS_ONLY = SoupStrainer('article')
 
 # --- Настройки ---
 FORUM_URL = "https://forum.arizona-rp.com/forums/3400/" 
 REFRESH_INTERVAL_SECONDS = 5
 DB_NAME = "forumnik_3_0.db" 
 TABLE_NAME = "Cases_DB" 
+# Сжатый HTML первого поста каждого иска - для повторного разбора без обращения к форуму (reparse_archive.py)
+HTML_ARCHIVE_TABLE_NAME = "Case_HTML_Archive"
 IGNORED_MEDIA_URLS = {"https://i.imgur.com/jfsvriz.png"}
 CHECK_REPLIES_EVERY_N_CYCLES = 4
+# Темы в статусе 'f', которых не видно в списке, проверяются с прежней периодичностью
+HIDDEN_REPLY_CHECK_SECONDS = CHECK_REPLIES_EVERY_N_CYCLES * REFRESH_INTERVAL_SECONDS
+SCREENSHOT_RECOVERY_HOURS = 24 # Иски без скриншота за этот период доснимаются при запуске
+# --- Обработка скриншотов ---
+# JPEG в пределах ограничений Telegram для фото, файлы по хешу содержимого (дубликаты общие)
+SCREENSHOT_STORE_DIR = os.path.join('screenshots', 'store')
+SCREENSHOT_MAX_WIDTH = 1280
+SCREENSHOT_JPEG_QUALITY = 85
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+TELEGRAM_PHOTO_MAX_SIDES_SUM = 10000 # Сумма ширины и высоты
+TELEGRAM_PHOTO_MAX_RATIO = 20 # Отношение высоты к ширине
+SCREENSHOT_RETENTION_DAYS = 30 # Скриншоты исков, закрытых или отклоненных раньше этого срока, удаляются
+SCREENSHOT_PRUNE_INTERVAL_SECONDS = 6 * 60 * 60
+REPLY_REFRESH_INTERVAL_SECONDS = 10 # Собственный интервал задачи проверки ответов
+# Режим обнаружения изменений: "html" - список тем каждые REFRESH_INTERVAL_SECONDS;
+# "feed" - дешевый опрос RSS раздела, а список тем загружается только при изменениях в ленте
+DISCOVERY_MODE = os.getenv("SENDER_DISCOVERY_MODE", "html")
+FORUM_FEED_URL = FORUM_URL + "index.rss"
+FEED_REFRESH_INTERVAL_SECONDS = 1
+# --- Адаптивный интервал опроса ---
+MIN_REFRESH_INTERVAL_SECONDS = 2 # Нижняя граница в часы пик (для режима feed - его собственный интервал)
+QUIET_REFRESH_INTERVAL_SECONDS = 30 # Интервал в тихие часы, если новых исков давно не было
+MAX_BACKOFF_SECONDS = 120 # Потолок экспоненциальной задержки при ошибках
+QUIET_HOURS = (2, 8) # Тихие часы по локальному времени: [начало, конец)
+ARRIVAL_WINDOW_SECONDS = 15 * 60 # За какой период учитываются новые иски и ответы
+POLL_JITTER_FRACTION = 0.2 # Случайный разброс интервала: ±20%
+HTTP_TIMEOUT_SECONDS = 15
+DETAIL_FETCH_CONCURRENCY = 4 # Сколько тем загружается одновременно при пачке новых исков
+REPLY_CHECK_CONCURRENCY = int(os.getenv("SENDER_REPLY_CHECK_CONCURRENCY", "4")) # Сколько тем в статусе 'f' проверяется одновременно
+REPLY_CHECK_TIMEOUT_SECONDS = 10 # Таймаут на загрузку одной темы при проверке ответов
+MAX_NEW_TOPIC_PAGES = 3 # Сколько страниц списка просматривать, если вся страница состоит из новых тем
+# Если задано, темы с ID ниже (максимальный ID - окно) считаются уже обработанными
+# и не хранятся в памяти. None - помнить все ссылки.
+SEEN_INDEX_ID_WINDOW = int(os.getenv("SENDER_SEEN_INDEX_ID_WINDOW", "0")) or None
+# --- Облегченный профиль браузера ---
+# FORUMNIK_LEAN_BROWSER=1: headless, стратегия загрузки 'eager', ограниченный размер окна
+# и блокировка картинок/медиа/шрифтов через CDP (снимается на время скриншота).
+# По умолчанию выключен: выигрыш по времени загрузки и памяти на нашем хосте еще не замерен -
+# перед включением сравните профили через bench_browser_profile.py
+LEAN_BROWSER = os.getenv("FORUMNIK_LEAN_BROWSER", "0") == "1"
+LEAN_WINDOW_SIZE = "1280,1024"
+BLOCKED_RESOURCE_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+                             "*.mp4", "*.webm", "*.mp3", "*.woff", "*.woff2", "*.ttf", "*.otf"]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36"
 
 # --- Селекторы CSS ---
 TOPIC_CONTAINER_SELECTOR = "div.structItemContainer-group.js-threadList" 
@@ -33,10 +99,17 @@ FIRST_POST_ARTICLE_SELECTOR = "article.message.message--post.js-post.js-inlineMo
 MESSAGE_MAIN_CELL_SELECTOR = "div.message-cell.message-cell--main" 
 POST_DATE_SELECTOR = "time.u-dt[datetime]" 
 POST_TEXT_SELECTOR = "div.message-content.js-messageContent div.bbWrapper"
+# Счетчики в списке тем (включая закрепленные и закрытые темы)
+ANY_THREAD_ITEM_SELECTOR = "div.structItem.structItem--thread"
+THREAD_ITEM_LINK_SELECTOR = 'div.structItem-title a[href*="/threads/"]'
+THREAD_REPLY_COUNT_SELECTOR = "div.structItem-cell--meta dl.pairs dd"
+THREAD_LAST_POST_SELECTOR = "div.structItem-cell--latest time"
 
 # --- Регулярные выражения ---
 # Ищет любую группу цифр в строке
 CASE_NUMBER_PATTERN = re.compile(r"(\d+)") 
+# ID темы из ссылки вида .../threads/nazvanie.12345/
+THREAD_ID_PATTERN = re.compile(r"/threads/(?:[^/]*\.)?(\d+)/")
 
 # --- Функции для работы с базой данных SQLite ---
 def setup_database(db_name, table_name):
@@ -48,17 +121,33 @@ def setup_database(db_name, table_name):
         current_judge TEXT, full_text TEXT, media_references TEXT, notes TEXT,                          
         officer_name TEXT, publication_time TEXT, scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
         status TEXT NOT NULL DEFAULT 'a', topic_link TEXT UNIQUE, topic_title TEXT,
-        screen TEXT, answers TEXT, post_count INTEGER DEFAULT 1
+        screen TEXT, answers TEXT, post_count INTEGER DEFAULT 1, status_changed_at TIMESTAMP
     )""")
     # Проверка и добавление колонок
     existing_columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table_name})").fetchall()]
-    columns_to_add = {'screen': 'TEXT', 'answers': 'TEXT', 'post_count': 'INTEGER DEFAULT 1'}
+    columns_to_add = {'screen': 'TEXT', 'answers': 'TEXT', 'post_count': 'INTEGER DEFAULT 1', 'status_changed_at': 'TIMESTAMP'}
     for col, col_type in columns_to_add.items():
         if col not in existing_columns:
             try:
                 cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} {col_type}")
                 print(f"Добавлена колонка '{col}' в таблицу '{table_name}'.")
+                if col == 'status_changed_at':
+                    # Для уже существующих исков момент смены статуса неизвестен - отсчет срока хранения начинается сейчас
+                    cursor.execute(f"UPDATE {table_name} SET status_changed_at = CURRENT_TIMESTAMP")
             except sqlite3.Error as e: print(f"Ошибка при добавлении колонки {col}: {e}")
+    # Статус меняют и бот, и скрапер в разных местах - время смены фиксирует триггер
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table_name}_status_changed AFTER UPDATE OF status ON {table_name}
+    WHEN NEW.status IS NOT OLD.status
+    BEGIN
+        UPDATE {table_name} SET status_changed_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+    END""")
+    setup_outbox(conn)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {HTML_ARCHIVE_TABLE_NAME} (
+        case_id INTEGER PRIMARY KEY, topic_link TEXT, post_html BLOB NOT NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
     conn.commit()
     return conn
 
@@ -71,23 +160,78 @@ def load_processed_topics_from_db(conn, table_name):
     except sqlite3.Error as e: print(f"Ошибка при загрузке ссылок из БД: {e}")
     return processed_links
 
-def insert_topic_data(conn, table_name, data_dict):
-    sql = f"INSERT INTO {table_name} (applicant_name, case_num, full_text, media_references, notes, officer_name, publication_time, status, topic_link, topic_title) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+def thread_id_from_url(url):
+    match = THREAD_ID_PATTERN.search(url or "")
+    return int(match.group(1)) if match else None
+
+class SeenTopicIndex:
+    """
+    Ссылки уже обработанных тем в памяти процесса. Загружается из БД один раз при запуске
+    и пополняется при каждой вставке, поэтому проверка списка стоит O(новых тем), а не O(всех исков).
+    """
+    def __init__(self, conn, table_name, id_window=SEEN_INDEX_ID_WINDOW):
+        self.links = load_processed_topics_from_db(conn, table_name)
+        self.id_window = id_window
+        self.max_thread_id = max((thread_id_from_url(link) or 0 for link in self.links), default=0)
+        self._prune()
+        print(f"Индекс обработанных тем загружен: {len(self.links)} ссылок, максимальный ID темы {self.max_thread_id}.")
+
+    def __contains__(self, url):
+        if url in self.links: return True
+        if self.id_window:
+            thread_id = thread_id_from_url(url)
+            return thread_id is not None and thread_id <= self.max_thread_id - self.id_window
+        return False
+
+    def add(self, url):
+        self.links.add(url)
+        self.max_thread_id = max(self.max_thread_id, thread_id_from_url(url) or 0)
+        if self.id_window and len(self.links) % 1000 == 0: self._prune()
+
+    def _prune(self):
+        if not self.id_window: return
+        floor = self.max_thread_id - self.id_window
+        self.links = {link for link in self.links if (thread_id_from_url(link) or floor + 1) > floor}
+
+def insert_topic_data(conn, table_name, data_dict, seen_index=None):
+    inserted = insert_topics_batch(conn, table_name, [data_dict], seen_index)
+    return inserted[0][1] if inserted else None
+
+def insert_topics_batch(conn, table_name, data_dicts, seen_index=None):
+    """
+    Вставляет пачку тем одной транзакцией. Возвращает [(data_dict, new_id), ...] для реально добавленных тем.
+    Ошибка БД пробрасывается дальше: цикл должен считаться неудачным, чтобы темы вставились при повторе.
+    """
+    sql = f"INSERT OR IGNORE INTO {table_name} (applicant_name, case_num, full_text, media_references, notes, officer_name, publication_time, status, topic_link, topic_title) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
     cursor = conn.cursor()
+    inserted = []
+    initial_note = f"[{datetime.now().strftime('%d.%m.%Y %H:%M:%S')}] Иск добавлен в систему скрапером."
     try:
-        initial_note = f"[{datetime.now().strftime('%d.%m.%Y %H:%M:%S')}] Иск добавлен в систему скрапером."
-        cursor.execute(sql, (
-            data_dict.get('applicant_name'), data_dict.get('case_num'), data_dict.get('full_text'),
-            data_dict.get('media_references'), initial_note, data_dict.get('officer_name'),
-            data_dict.get('publication_time'), 'a', data_dict.get('topic_link'),
-            data_dict.get('topic_title')
-        ))
-        conn.commit()
-        return cursor.lastrowid
-    except sqlite3.IntegrityError: return None
+        with conn:
+            for data_dict in data_dicts:
+                cursor.execute(sql, (
+                    data_dict.get('applicant_name'), data_dict.get('case_num'), data_dict.get('full_text'),
+                    data_dict.get('media_references'), initial_note, data_dict.get('officer_name'),
+                    data_dict.get('publication_time'), 'a', data_dict.get('topic_link'),
+                    data_dict.get('topic_title')
+                ))
+                if not cursor.rowcount: continue
+                new_id = cursor.lastrowid
+                inserted.append((data_dict, new_id))
+                # Уведомление попадает в очередь вместе с иском: либо оба записаны, либо ни одного
+                enqueue_notification(cursor, 'new_case', data_dict.get('topic_title'), new_id)
+                if data_dict.get('post_html'):
+                    cursor.execute(
+                        f"INSERT OR REPLACE INTO {HTML_ARCHIVE_TABLE_NAME} (case_id, topic_link, post_html) VALUES (?, ?, ?)",
+                        (new_id, data_dict.get('topic_link'), zlib.compress(data_dict['post_html'].encode('utf-8')))
+                    )
     except sqlite3.Error as e:
         print(f"  Ошибка при вставке данных в БД: {e}")
-        return None
+        raise
+    if seen_index is not None:
+        # Пропущенные INSERT OR IGNORE темы уже есть в БД - они тоже считаются обработанными
+        for data_dict in data_dicts: seen_index.add(data_dict.get('topic_link'))
+    return inserted
 
 def get_judge_tg_id(conn, judge_nick_name):
     if not judge_nick_name: return None
@@ -132,24 +276,210 @@ def parse_post_text_details(text_content):
 
 
 # --- Остальные функции (setup_driver, extract_media_links_from_html, и т.д.) ---
-def setup_driver():
+def setup_driver(lean=LEAN_BROWSER):
     chrome_options = Options()
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36")
-    chrome_options.add_argument("--start-maximized")
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+    if lean:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument(f"--window-size={LEAN_WINDOW_SIZE}")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.page_load_strategy = 'eager' # Не ждать загрузки картинок и iframe
+    else:
+        chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
     service = Service(ChromeDriverManager().install())
     driver = webdriver.Chrome(service=service, options=chrome_options)
     driver.implicitly_wait(10) 
+    driver.lean_profile = lean
+    if lean:
+        driver.execute_cdp_cmd("Network.enable", {})
+        set_resource_blocking(driver, True)
     return driver
 
+def set_resource_blocking(driver, enabled):
+    """Включает/выключает блокировку картинок, медиа и шрифтов (только для облегченного профиля)."""
+    if not getattr(driver, 'lean_profile', False): return
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_PATTERNS if enabled else []})
+
+# --- Ленивый запуск браузера ---
+# Список тем загружается по HTTP, поэтому Chrome запускается только тогда,
+# когда он действительно нужен (скриншот, детали темы, запасной парсинг).
+# У каждой задачи скрапера свой браузер: WebDriver нельзя делить между потоками.
+class LazyDriver:
+    def __init__(self, name):
+        self.name = name
+        self.driver = None
+
+    def get(self):
+        if self.driver is None:
+            print(f"[{self.name}] Запускаю браузер...")
+            self.driver = setup_driver()
+        return self.driver
+
+    def quit(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+# --- Загрузка списка тем по HTTP ---
+def parse_thread_list(page_html, base_url):
+    """Разбирает список тем из HTML раздела. Возвращает [{'title', 'url'}, ...] без закрытых тем."""
+    return parse_thread_list_page(page_html, base_url)[0]
+
+def parse_thread_counters(soup):
+    """
+    Счетчики всех тем на странице (обычных, закрепленных и закрытых):
+    {ID темы: (число ответов, время последнего сообщения)} - как они показаны в списке.
+    """
+    counters = {}
+    for item in soup.select(ANY_THREAD_ITEM_SELECTOR):
+        link_element = item.select_one(THREAD_ITEM_LINK_SELECTOR)
+        thread_id = thread_id_from_url(link_element.get('href')) if link_element else None
+        if thread_id is None: continue
+        reply_count = item.select_one(THREAD_REPLY_COUNT_SELECTOR)
+        last_post = item.select_one(THREAD_LAST_POST_SELECTOR)
+        counters[thread_id] = (
+            reply_count.get_text(strip=True) if reply_count else None,
+            (last_post.get('data-time') or last_post.get('datetime')) if last_post else None
+        )
+    return counters
+
+def parse_thread_list_page(page_html, base_url):
+    """Один разбор страницы раздела: (список новых кандидатов, счетчики ответов всех тем)."""
+    soup = BeautifulSoup(page_html, HTML_PARSER)
+    topic_container = soup.select_one(TOPIC_CONTAINER_SELECTOR)
+    if topic_container is None:
+        raise ValueError("на странице нет списка тем (возможно, страница защиты от ботов)")
+    topics = []
+    for item in topic_container.select(INDIVIDUAL_THREAD_ITEM_SELECTOR):
+        if 'is-locked' in item.get('class', []): continue
+        link_element = item.select_one(THREAD_TITLE_LINK_SELECTOR)
+        if link_element is None or not link_element.get('href'): continue
+        topics.append({'title': link_element.get_text(' ', strip=True), 'url': urljoin(base_url, link_element['href'])})
+    return topics, parse_thread_counters(soup)
+
+class ThreadListFetcher:
+    """
+    Загружает список тем раздела обычным HTTP-запросом через одно постоянное соединение.
+    Отправляет условные запросы (If-None-Match / If-Modified-Since): если страница
+    не менялась, форум отвечает 304 и используется разобранный ранее список.
+    """
+    def __init__(self, forum_url):
+        self.forum_url = forum_url
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+        self.etag = None
+        self.last_modified = None
+        self.topics = []
+        self.counters = {} # Счетчики ответов с последней успешно загруженной страницы
+
+    def fetch(self):
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        try:
+            response = self.session.get(self.forum_url, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
+            if response.status_code == 304:
+                return self.topics
+            response.raise_for_status()
+            self.topics, self.counters = parse_thread_list_page(response.text, self.forum_url)
+        except Exception:
+            # Устаревшие счетчики не должны скрывать новые ответы
+            self.counters = {}
+            raise
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        return self.topics
+
+    def fetch_page(self, page_number):
+        """Следующие страницы списка (forums/3400/page-2 и т.д.) - без условных заголовков."""
+        response = self.session.get(urljoin(self.forum_url, f"page-{page_number}"), timeout=HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return parse_thread_list(response.text, self.forum_url)
+
+def collect_new_topics(thread_list_fetcher, first_page_topics, processed_links):
+    """
+    Собирает все новые темы за цикл. Если новой оказалась вся страница списка,
+    просматривает следующие (до MAX_NEW_TOPIC_PAGES). Старые темы идут первыми.
+    """
+    new_topics, page_topics, page_number = {}, first_page_topics, 1
+    while True:
+        page_new = [topic for topic in page_topics if topic['url'] not in processed_links]
+        for topic in page_new: new_topics.setdefault(topic['url'], topic)
+        if not page_topics or len(page_new) < len(page_topics) or page_number >= MAX_NEW_TOPIC_PAGES: break
+        page_number += 1
+        print(f"  Вся страница {page_number - 1} состоит из новых тем, загружаю страницу {page_number}...")
+        try:
+            page_topics = thread_list_fetcher.fetch_page(page_number)
+        except Exception as e:
+            print(f"  Не удалось загрузить страницу {page_number} списка тем: {e}")
+            break
+    return list(reversed(new_topics.values()))
+
+# --- RSS-лента раздела ---
+SLASH_COMMENTS_TAG = "{http://purl.org/rss/1.0/modules/slash/}comments"
+
+def parse_feed(feed_xml):
+    """Элементы RSS-ленты раздела: [(ID темы, число ответов), ...] в порядке ленты."""
+    items = []
+    for item in ET.fromstring(feed_xml).iter('item'):
+        thread_id = thread_id_from_url(item.findtext('link'))
+        if thread_id is not None: items.append((thread_id, item.findtext(SLASH_COMMENTS_TAG)))
+    return items
+
+class FeedWatcher:
+    """
+    Опрашивает RSS раздела (условными запросами через ту же сессию) и сообщает, изменилось ли
+    что-то с прошлого опроса: новая тема или новый ответ меняют состав ленты или счетчик slash:comments.
+    Замеченное изменение остается "в работе", пока задача не вызовет mark_processed() после
+    успешного прохода по HTML: если проход упал, следующие опросы снова сообщают об изменениях.
+    """
+    def __init__(self, feed_url, session):
+        self.feed_url = feed_url
+        self.session = session
+        self.etag = None
+        self.last_modified = None
+        self.signature = None
+        self.pass_pending = False
+
+    def has_changes(self):
+        if self.pass_pending: return True # Прошлый проход по HTML не завершился - ленту не опрашиваем
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        response = self.session.get(self.feed_url, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+        signature = tuple(parse_feed(response.content))
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.pass_pending = signature != self.signature
+        self.signature = signature
+        return self.pass_pending
+
+    def mark_processed(self):
+        self.pass_pending = False
+
+def fetch_thread_list_with_driver(driver, forum_url):
+    """Запасной путь: список тем через браузер (если HTTP-запрос не прошел)."""
+    driver.get(forum_url)
+    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CSS_SELECTOR, TOPIC_CONTAINER_SELECTOR)))
+    # Один снимок страницы вместо find_element/get_attribute на каждую тему
+    return parse_thread_list(driver.page_source, forum_url)
+
 def extract_media_links_from_html(html_content, base_url):
-    soup = BeautifulSoup(html_content, 'html.parser')
+    return extract_media_links(BeautifulSoup(html_content, HTML_PARSER), base_url)
+
+def extract_media_links(element, base_url):
+    """Ссылки из уже разобранного элемента (без повторного разбора HTML)."""
     links = set()
-    for a_tag in soup.find_all('a', href=True):
+    for a_tag in element.find_all('a', href=True):
         href = a_tag['href']
         if href and href.strip().lower() not in IGNORED_MEDIA_URLS and '#' not in href:
             if href.startswith('http://') or href.startswith('https://'):
@@ -160,140 +490,485 @@ def extract_media_links_from_html(html_content, base_url):
     return sorted(list(links))
 
 def get_topic_details(driver, topic_url, base_url_for_links):
+    """Запасной путь через браузер. Скриншот здесь не делается - его снимает отдельная задача после вставки."""
     print(f"  Перехожу на страницу темы: {topic_url}")
     driver.get(topic_url)
-    screenshot_path, pub_date, plain_text, parsed_details, media_links = None, None, None, {}, []
     try:
-        first_post = WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.CSS_SELECTOR, FIRST_POST_ARTICLE_SELECTOR)))
-        try:
-            screenshots_dir = 'screenshots'
-            os.makedirs(screenshots_dir, exist_ok=True)
-            temp_screenshot_path = os.path.join(screenshots_dir, 'temp_case_screenshot.png')
-            if first_post.screenshot(temp_screenshot_path):
-                screenshot_path = temp_screenshot_path
-                print(f"  Скриншот первого поста сохранен во временный файл.")
-        except Exception as e: print(f"    Предупреждение: Не удалось сделать скриншот: {e}")
-        main_cell = first_post.find_element(By.CSS_SELECTOR, MESSAGE_MAIN_CELL_SELECTOR)
-        pub_date = main_cell.find_element(By.CSS_SELECTOR, POST_DATE_SELECTOR).get_attribute("title")
-        text_container = main_cell.find_element(By.CSS_SELECTOR, POST_TEXT_SELECTOR)
-        html_content = text_container.get_attribute('innerHTML')
-        plain_text = BeautifulSoup(html_content, 'html.parser').get_text(separator='\n', strip=True)
-        parsed_details = parse_post_text_details(plain_text)
-        media_links = extract_media_links_from_html(html_content, base_url_for_links)
-        return pub_date, plain_text, parsed_details, media_links, screenshot_path
+        WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.CSS_SELECTOR, FIRST_POST_ARTICLE_SELECTOR)))
+        # Данные поста - из одного снимка страницы, разобранного локально
+        return parse_topic_details(driver.page_source, base_url_for_links)
     except Exception as e:
         print(f"  Ошибка при сборе деталей темы {topic_url}: {e}")
         return None, None, {}, [], None
 
+# --- Детали новых тем по HTTP ---
+def parse_topic_details(page_html, base_url):
+    """
+    Разбор первого поста по HTML страницы темы (ответ HTTP-запроса или page_source браузера).
+    Возвращает (дата, текст, заявитель/ответчик, ссылки на медиа, innerHTML поста для архива).
+    """
+    soup = BeautifulSoup(page_html, HTML_PARSER, parse_only=POSTS_ONLY)
+    first_post = soup.select_one(FIRST_POST_ARTICLE_SELECTOR)
+    if first_post is None: raise ValueError("на странице темы нет первого поста")
+    main_cell = first_post.select_one(MESSAGE_MAIN_CELL_SELECTOR)
+    date_element = main_cell.select_one(POST_DATE_SELECTOR)
+    pub_date = date_element.get('title') if date_element else None
+    text_container = main_cell.select_one(POST_TEXT_SELECTOR)
+    plain_text, parsed_details, media_links = extract_post_content(text_container, base_url)
+    return pub_date, plain_text, parsed_details, media_links, text_container.decode_contents()
+
+def extract_post_content(text_container, base_url):
+    """Один проход по разобранному тексту поста: (текст, заявитель/ответчик, ссылки на медиа)."""
+    plain_text = text_container.get_text(separator='\n', strip=True)
+    return plain_text, parse_post_text_details(plain_text), extract_media_links(text_container, base_url)
+
+def parse_post_html(html_content, base_url):
+    """То же по сохраненному innerHTML поста (bbWrapper) - для архива и замеров."""
+    return extract_post_content(BeautifulSoup(html_content, HTML_PARSER), base_url)
+
+def fetch_topic_details_http(session, topic_url):
+    response = session.get(topic_url, timeout=HTTP_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return parse_topic_details(response.text, topic_url)
+
+def build_topic_record(title, url, pub_date, plain_text, parsed_details, media_links, post_html=None):
+    case_num_match = CASE_NUMBER_PATTERN.search(title)
+    extracted_case_number = case_num_match.group(1) if case_num_match else None
+    if not extracted_case_number: print(f"    ПРЕДУПРЕЖДЕНИЕ: Не удалось извлечь номер иска из заголовка '{title}'.")
+    parsed_details = parsed_details or {}
+    return {
+        'topic_title': title, 'topic_link': url, 'publication_time': pub_date, 
+        'full_text': plain_text, 'case_num': extracted_case_number,
+        'applicant_name': parsed_details.get('applicant'), 'officer_name': parsed_details.get('officer'),
+        'media_references': json.dumps(media_links) if media_links else None,
+        'post_html': post_html # Не колонка Cases_DB: уходит в архив HTML
+    }
+
+def fetch_new_topic_records(session, new_topics, browser):
+    """Загружает детали новых тем параллельно (не больше DETAIL_FETCH_CONCURRENCY запросов одновременно)."""
+    def fetch(topic):
+        try:
+            return topic, fetch_topic_details_http(session, topic['url'])
+        except Exception as e:
+            print(f"  HTTP-загрузка темы {topic['url']} не удалась ({e}). Использую браузер.")
+            return topic, None
+
+    with ThreadPoolExecutor(max_workers=DETAIL_FETCH_CONCURRENCY) as executor:
+        results = list(executor.map(fetch, new_topics))
+
+    records = []
+    for topic, details in results:
+        if details is None:
+            details = get_topic_details(browser.get(), topic['url'], topic['url'])
+        records.append(build_topic_record(topic['title'], topic['url'], *details))
+    return records
+
+def capture_topic_screenshot(driver, topic_url, screenshot_path):
+    """Скриншот первого поста темы. Возвращает путь к файлу или None."""
+    try:
+        # Для скриншота нужны картинки: снимаем блокировку и ждем полной загрузки страницы
+        set_resource_blocking(driver, False)
+        driver.get(topic_url)
+        first_post = WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.CSS_SELECTOR, FIRST_POST_ARTICLE_SELECTOR)))
+        if getattr(driver, 'lean_profile', False):
+            WebDriverWait(driver, 15).until(lambda d: d.execute_script("return document.readyState") == "complete")
+        os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
+        if first_post.screenshot(screenshot_path):
+            return screenshot_path
+    except Exception as e: print(f"    Предупреждение: Не удалось сделать скриншот темы {topic_url}: {e}")
+    finally:
+        try: set_resource_blocking(driver, True)
+        except Exception: pass
+    return None
+
 def scrape_thread_answers(driver, topic_url):
     print(f"  Собираю все ответы из темы: {topic_url}")
     driver.get(topic_url)
-    all_answers_text, page_post_count = "", 0
     try:
-        post_elements = WebDriverWait(driver, 15).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "article.message")))
-        page_post_count = len(post_elements)
-        for i, post in enumerate(post_elements[1:], start=1):
-            try:
-                author = post.find_element(By.CSS_SELECTOR, "h4.message-name").text.strip()
-                post_text_element = post.find_element(By.CSS_SELECTOR, "div.bbWrapper")
-                post_text = post_text_element.text.strip()
-                links = [a.get_attribute('href') for a in post_text_element.find_elements(By.TAG_NAME, 'a')]
-                answer_block = f"Ответ {i} от {author}: =============================\n{post_text}\n"
-                if links: answer_block += "(Ссылки: " + ", ".join(filter(None, links)) + ")\n"
-                answer_block += f"Конец ответа {i}: ========================\n\n"
-                all_answers_text += answer_block
-            except Exception as e_post: print(f"    - Ошибка при парсинге поста #{i+1}: {e_post}")
-        return all_answers_text.strip(), page_post_count
+        WebDriverWait(driver, 15).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "article.message")))
+        # Один снимок страницы вместо нескольких запросов к chromedriver на каждый пост
+        return parse_thread_answers(driver.page_source, driver.current_url)
     except Exception as e:
         print(f"  Ошибка при сборе ответов из темы {topic_url}: {e}")
-        return "", page_post_count
+        return "", 0
+
+# --- Параллельная проверка ответов ---
+def parse_thread_answers(page_html, page_url):
+    """
+    Ответы из HTML страницы темы: (текст всех ответов, число постов на странице).
+    Ссылки приводятся к абсолютным относительно page_url - как их отдавал get_attribute('href') в Selenium.
+    """
+    soup = BeautifulSoup(page_html, HTML_PARSER, parse_only=POSTS_ONLY)
+    post_elements = soup.select("article.message")
+    all_answers_text = ""
+    for i, post in enumerate(post_elements[1:], start=1):
+        try:
+            author = post.select_one("h4.message-name").get_text(strip=True)
+            post_text_element = post.select_one("div.bbWrapper")
+            post_text = post_text_element.get_text(separator='\n', strip=True)
+            links = [urljoin(page_url, a['href']) for a in post_text_element.find_all('a', href=True)]
+            answer_block = f"Ответ {i} от {author}: =============================\n{post_text}\n"
+            if links: answer_block += "(Ссылки: " + ", ".join(filter(None, links)) + ")\n"
+            answer_block += f"Конец ответа {i}: ========================\n\n"
+            all_answers_text += answer_block
+        except Exception as e_post: print(f"    - Ошибка при парсинге поста #{i+1}: {e_post}")
+    return all_answers_text.strip(), len(post_elements)
+
+def fetch_thread_answers_http(session, topic_url):
+    response = session.get(topic_url, timeout=REPLY_CHECK_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return parse_thread_answers(response.text, response.url)
+
+class ReplyCounterIndex:
+    """
+    Последние увиденные в списке тем счетчики (ответы, время последнего сообщения) по ID темы.
+    Открывать тему нужно только тогда, когда ее счетчики изменились с прошлой проверки.
+    """
+    def __init__(self):
+        self.counters = {}
+
+    def select_changed(self, cases, list_counters, include_hidden):
+        """
+        cases: [(case_id, topic_link)]. Возвращает темы для проверки: с изменившимися счетчиками,
+        а также (если include_hidden) темы, которых нет на первой странице списка.
+        """
+        to_check = []
+        for case_id, topic_link in cases:
+            current = list_counters.get(thread_id_from_url(topic_link))
+            if current is None:
+                if include_hidden: to_check.append((case_id, topic_link))
+            elif self.counters.get(thread_id_from_url(topic_link)) != current:
+                to_check.append((case_id, topic_link))
+        return to_check
+
+    def remember(self, topic_link, list_counters):
+        thread_id = thread_id_from_url(topic_link)
+        if thread_id in list_counters: self.counters[thread_id] = list_counters[thread_id]
+
+def check_thread_answers(session, cases_to_check, browser):
+    """
+    Загружает темы параллельно (не больше REPLY_CHECK_CONCURRENCY одновременно, у каждой
+    свой таймаут). Темы, которые не удалось загрузить по HTTP, проверяются через браузер.
+    Возвращает {case_id: (answers_text, page_post_count)}.
+    """
+    results, failed = {}, []
+    with ThreadPoolExecutor(max_workers=REPLY_CHECK_CONCURRENCY) as executor:
+        futures = {executor.submit(fetch_thread_answers_http, session, topic_link): (case_id, topic_link)
+                   for case_id, topic_link in cases_to_check}
+        for future in as_completed(futures):
+            case_id, topic_link = futures[future]
+            try:
+                results[case_id] = future.result()
+            except Exception as e:
+                print(f"  HTTP-проверка иска #{case_id} не удалась ({e}).")
+                failed.append((case_id, topic_link))
+    for case_id, topic_link in failed:
+        results[case_id] = scrape_thread_answers(browser.get(), topic_link)
+    return results
+
+def run_reply_check(conn, session, reply_index, list_counters, include_hidden, browser):
+    """Проверяет ответы в исках со статусом 'f', открывая только изменившиеся темы."""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, topic_link, post_count, current_judge, topic_title FROM {TABLE_NAME} WHERE status = 'f'")
+    cases = {row[0]: row for row in cursor.fetchall()}
+    to_check = reply_index.select_changed([(row[0], row[1]) for row in cases.values()], list_counters, include_hidden)
+    if not to_check: return 0
+    new_replies = 0
+    print(f"\n--- [Проверка ответов: изменилось {len(to_check)} из {len(cases)} тем в статусе 'f'] ---")
+    thread_answers = check_thread_answers(session, to_check, browser)
+    for case_id, _ in to_check:
+        _, topic_link, db_post_count, current_judge, topic_title = cases[case_id]
+        answers_text, page_post_count = thread_answers[case_id]
+        if page_post_count > (db_post_count or 0):
+            print(f"  ! ОБНАРУЖЕН НОВЫЙ ОТВЕТ в иске #{case_id} ({page_post_count} > {db_post_count})")
+            judge_tg_id = get_judge_tg_id(conn, current_judge)
+            with conn:
+                cursor.execute(f"UPDATE {TABLE_NAME} SET answers = ?, post_count = ? WHERE id = ?", (answers_text, page_post_count, case_id))
+                if judge_tg_id:
+                    print(f"  -> Уведомление для судьи {current_judge} по иску #{case_id} поставлено в очередь.")
+                    enqueue_notification(cursor, 'new_reply', topic_title, case_id, judge_tg_id)
+            new_replies += 1
+        # Счетчики запоминаются только после записи ответа: если транзакция не прошла
+        # (например, БД занята ботом), тема откроется снова в следующем цикле
+        if page_post_count: reply_index.remember(topic_link, list_counters)
+    print("--- [Проверка ответов завершена] ---")
+    return new_replies
+
+# --- Адаптивный планировщик опроса ---
+class PollScheduler:
+    """
+    Выбирает паузу перед следующим опросом форума:
+    - при ошибках - экспоненциальная задержка от базового интервала (до MAX_BACKOFF_SECONDS);
+    - если за ARRIVAL_WINDOW_SECONDS приходили иски/ответы - опрос чаще, чем базовый;
+    - в тихие часы без активности - QUIET_REFRESH_INTERVAL_SECONDS;
+    - к итоговому интервалу добавляется случайный разброс, чтобы не бить в форум ровными тиками.
+    """
+    def __init__(self, base_interval, min_interval=MIN_REFRESH_INTERVAL_SECONDS, quiet_interval=QUIET_REFRESH_INTERVAL_SECONDS):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.quiet_interval = max(quiet_interval, base_interval)
+        self.arrivals = deque()
+        self.error_streak = 0
+        self.current_interval = base_interval
+        self.reason = "базовый интервал"
+
+    def record_arrivals(self, count):
+        now = time.monotonic()
+        self.arrivals.extend([now] * count)
+
+    def record_success(self):
+        self.error_streak = 0
+
+    def record_error(self):
+        self.error_streak += 1
+
+    @staticmethod
+    def is_quiet_hour():
+        start, end = QUIET_HOURS
+        return start <= datetime.now().hour < end
+
+    def next_interval(self):
+        now = time.monotonic()
+        while self.arrivals and now - self.arrivals[0] > ARRIVAL_WINDOW_SECONDS:
+            self.arrivals.popleft()
+        if self.error_streak:
+            interval = min(MAX_BACKOFF_SECONDS, self.base_interval * 2 ** self.error_streak)
+            self.reason = f"ошибок подряд: {self.error_streak}"
+        elif self.arrivals:
+            interval = max(self.min_interval, self.base_interval / (1 + len(self.arrivals)))
+            self.reason = f"событий за {ARRIVAL_WINDOW_SECONDS // 60} мин: {len(self.arrivals)}"
+        elif self.is_quiet_hour():
+            interval = self.quiet_interval
+            self.reason = "тихие часы"
+        else:
+            interval = self.base_interval
+            self.reason = "базовый интервал"
+        self.current_interval = interval * random.uniform(1 - POLL_JITTER_FRACTION, 1 + POLL_JITTER_FRACTION)
+        return self.current_interval
+
+# --- Задачи скрапера ---
+# Новые иски и ответы проверяются в двух независимых потоках: у каждого свой
+# HTTP-клиент, свое соединение с БД, свой браузер и свой планировщик, поэтому
+# долгая проверка ответов не задерживает уведомления о новых исках.
+def run_new_case_cycle(conn, thread_list_fetcher, seen_topics, browser, scheduler, screenshot_queue):
+    print("\n--- [Иски] Цикл проверки новых исков ---")
+    try:
+        all_topics_on_page = thread_list_fetcher.fetch()
+    except Exception as e:
+        print(f"  HTTP-загрузка списка тем не удалась ({e}). Использую браузер.")
+        all_topics_on_page = fetch_thread_list_with_driver(browser.get(), FORUM_URL)
+
+    # Конвейер: все новые темы -> параллельная загрузка деталей -> одна транзакция (иски + очередь уведомлений).
+    # Скриншоты снимает отдельная задача: уведомление не ждет отрисовки картинки
+    new_topics = collect_new_topics(thread_list_fetcher, all_topics_on_page, seen_topics)
+    if not new_topics:
+        print("Новых тем не найдено.")
+        return
+    print(f"\n  Найдено новых тем: {len(new_topics)}")
+    for topic_data in new_topics: print(f"  - {topic_data['title']}")
+    records = fetch_new_topic_records(thread_list_fetcher.session, new_topics, browser)
+    inserted = insert_topics_batch(conn, TABLE_NAME, records, seen_topics)
+    scheduler.record_arrivals(len(inserted))
+    for record, new_id in inserted:
+        screenshot_queue.put((new_id, record['topic_link']))
+
+def feed_reports_changes(feed_watcher):
+    try:
+        return feed_watcher.has_changes()
+    except Exception as e:
+        print(f"  Не удалось загрузить RSS-ленту ({e}). Проверяю список тем.")
+        return True
+
+def new_case_task(stop_event, screenshot_queue):
+    conn = sqlite3.connect(DB_NAME)
+    thread_list_fetcher = ThreadListFetcher(FORUM_URL)
+    seen_topics = SeenTopicIndex(conn, TABLE_NAME)
+    browser = LazyDriver("Иски")
+    feed_watcher = FeedWatcher(FORUM_FEED_URL, thread_list_fetcher.session) if DISCOVERY_MODE == "feed" else None
+    scheduler = PollScheduler(FEED_REFRESH_INTERVAL_SECONDS if feed_watcher else REFRESH_INTERVAL_SECONDS)
+    try:
+        while not stop_event.is_set():
+            if feed_watcher and not feed_reports_changes(feed_watcher):
+                scheduler.record_success()
+                stop_event.wait(scheduler.next_interval())
+                continue
+            try:
+                run_new_case_cycle(conn, thread_list_fetcher, seen_topics, browser, scheduler, screenshot_queue)
+                if feed_watcher: feed_watcher.mark_processed()
+                scheduler.record_success()
+            except Exception as e:
+                print(f"[Иски] Ошибка в цикле проверки: {e}")
+                scheduler.record_error()
+            interval = scheduler.next_interval()
+            print(f"[Иски] Следующая проверка через {interval:.1f} секунд ({scheduler.reason})...")
+            stop_event.wait(interval)
+    finally:
+        browser.quit()
+        conn.close()
+
+def reply_check_task(stop_event):
+    conn = sqlite3.connect(DB_NAME)
+    thread_list_fetcher = ThreadListFetcher(FORUM_URL)
+    reply_index = ReplyCounterIndex()
+    browser = LazyDriver("Ответы")
+    feed_watcher = FeedWatcher(FORUM_FEED_URL, thread_list_fetcher.session) if DISCOVERY_MODE == "feed" else None
+    scheduler = PollScheduler(FEED_REFRESH_INTERVAL_SECONDS if feed_watcher else REPLY_REFRESH_INTERVAL_SECONDS)
+    last_hidden_reply_check = 0
+    try:
+        while not stop_event.is_set():
+            include_hidden = time.monotonic() - last_hidden_reply_check >= HIDDEN_REPLY_CHECK_SECONDS
+            if feed_watcher and not include_hidden and not feed_reports_changes(feed_watcher):
+                scheduler.record_success()
+                stop_event.wait(scheduler.next_interval())
+                continue
+            try:
+                # Свежие счетчики ответов; при ошибке загрузки fetch() сбрасывает их,
+                # и темы проверяются только по периодичности HIDDEN_REPLY_CHECK_SECONDS
+                list_loaded = True
+                try:
+                    thread_list_fetcher.fetch()
+                except Exception as e:
+                    print(f"[Ответы] Не удалось загрузить список тем: {e}")
+                    list_loaded = False
+                # Темы с изменившимися счетчиками - каждый цикл; темы, которых нет
+                # на первой странице списка, - раз в HIDDEN_REPLY_CHECK_SECONDS
+                scheduler.record_arrivals(run_reply_check(conn, thread_list_fetcher.session, reply_index,
+                                                          thread_list_fetcher.counters, include_hidden, browser))
+                if include_hidden: last_hidden_reply_check = time.monotonic()
+                # Без свежего списка изменившиеся темы не видны - изменение из ленты остается в работе
+                if feed_watcher and (list_loaded or include_hidden): feed_watcher.mark_processed()
+                scheduler.record_success()
+            except Exception as e:
+                print(f"[Ответы] Ошибка в цикле проверки: {e}")
+                scheduler.record_error()
+            stop_event.wait(scheduler.next_interval())
+    finally:
+        browser.quit()
+        conn.close()
+
+# --- Сжатие и хранение скриншотов ---
+def encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def store_by_hash(data):
+    """Сохраняет файл под именем sha256 содержимого; одинаковые картинки хранятся один раз."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(SCREENSHOT_STORE_DIR, digest[:2], f"{digest}.jpg")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f: f.write(data)
+        os.replace(temp_path, path)
+    return path
+
+def process_screenshot(png_path):
+    """
+    PNG со скриншотом -> JPEG для Telegram в хранилище по хешу. Исходный PNG удаляется.
+    Слишком длинный пост обрезается снизу, чтобы уложиться в допустимое для фото отношение сторон.
+    """
+    with Image.open(png_path) as source:
+        image = source.convert('RGB')
+    width, height = image.size
+    if height > width * TELEGRAM_PHOTO_MAX_RATIO:
+        height = width * TELEGRAM_PHOTO_MAX_RATIO
+        image = image.crop((0, 0, width, height))
+    scale = min(1, SCREENSHOT_MAX_WIDTH / width, (TELEGRAM_PHOTO_MAX_SIDES_SUM - 1) / (width + height))
+    if scale < 1:
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+
+    quality = SCREENSHOT_JPEG_QUALITY
+    data = encode_jpeg(image, quality)
+    while len(data) > TELEGRAM_PHOTO_MAX_BYTES and quality > 40:
+        quality -= 15
+        data = encode_jpeg(image, quality)
+    screen_path = store_by_hash(data)
+    os.remove(png_path)
+    return screen_path
+
+def prune_old_screenshots(conn):
+    """
+    Удаляет скриншоты исков, закрытых или отклоненных (FINAL_CASE_STATUSES) больше SCREENSHOT_RETENTION_DAYS
+    назад (по status_changed_at, а не по дате появления иска); общий файл удаляется, только если на него
+    больше никто не ссылается.
+    """
+    cursor = conn.cursor()
+    placeholders = ", ".join("?" for _ in FINAL_CASE_STATUSES)
+    cursor.execute(f"""
+        SELECT id, screen FROM {TABLE_NAME}
+        WHERE status IN ({placeholders}) AND screen IS NOT NULL AND status_changed_at < datetime('now', ?)
+    """, (*FINAL_CASE_STATUSES, f"-{SCREENSHOT_RETENTION_DAYS} days"))
+    rows = cursor.fetchall()
+    if not rows: return
+    with conn:
+        cursor.executemany(f"UPDATE {TABLE_NAME} SET screen = NULL WHERE id = ?", [(row[0],) for row in rows])
+    removed = 0
+    for path in {row[1] for row in rows}:
+        cursor.execute(f"SELECT 1 FROM {TABLE_NAME} WHERE screen = ? LIMIT 1", (path,))
+        if cursor.fetchone() is None and os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    print(f"[Скриншоты] Очистка: {len(rows)} завершенных исков, удалено файлов: {removed}.")
+
+def screenshot_task(stop_event, screenshot_queue):
+    """
+    Снимает скриншоты первых постов новых исков: каждый - в свой файл case_<id>.png, который
+    затем сжимается в хранилище по хешу; после этого обновляет Cases_DB.screen.
+    При запуске доснимает иски последних суток без скриншота, периодически чистит старые.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    browser = LazyDriver("Скриншоты")
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, topic_link FROM {TABLE_NAME} WHERE screen IS NULL AND scraped_at >= datetime('now', ?)",
+                   (f"-{SCREENSHOT_RECOVERY_HOURS} hours",))
+    for row in cursor.fetchall(): screenshot_queue.put(row)
+    last_prune = 0
+    try:
+        while not stop_event.is_set():
+            if time.monotonic() - last_prune >= SCREENSHOT_PRUNE_INTERVAL_SECONDS:
+                try: prune_old_screenshots(conn)
+                except Exception as e: print(f"[Скриншоты] Ошибка очистки старых скриншотов: {e}")
+                last_prune = time.monotonic()
+            try:
+                case_id, topic_link = screenshot_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                screenshot_path = capture_topic_screenshot(browser.get(), topic_link, os.path.join('screenshots', f'case_{case_id}.png'))
+                if screenshot_path:
+                    try:
+                        screenshot_path = process_screenshot(screenshot_path)
+                    except Exception as e:
+                        print(f"[Скриншоты] Не удалось сжать скриншот иска #{case_id}, сохраняю PNG: {e}")
+                    cursor.execute(f"UPDATE {TABLE_NAME} SET screen = ? WHERE id = ?", (screenshot_path, case_id))
+                    conn.commit()
+                    print(f"[Скриншоты] Скриншот иска #{case_id} готов.")
+            except Exception as e:
+                print(f"[Скриншоты] Ошибка при съемке иска #{case_id}: {e}")
+    finally:
+        browser.quit()
+        conn.close()
 
 # --- Основной скрипт ---
 if __name__ == "__main__":
-    db_connection = setup_database(DB_NAME, TABLE_NAME) 
-    selenium_driver = setup_driver()
-    cycle_counter = 0
+    setup_database(DB_NAME, TABLE_NAME).close()
+    stop_event = threading.Event()
+    screenshot_queue = queue.Queue()
+    tasks = [
+        threading.Thread(target=new_case_task, args=(stop_event, screenshot_queue), name="new_cases"),
+        threading.Thread(target=reply_check_task, args=(stop_event,), name="replies"),
+        threading.Thread(target=screenshot_task, args=(stop_event, screenshot_queue), name="screenshots"),
+    ]
     try:
-        print(f"Запускаю мониторинг форума...")
-        while True: 
-            cycle_counter += 1
-            if cycle_counter > 1 and cycle_counter % CHECK_REPLIES_EVERY_N_CYCLES == 0:
-                print("\n--- [Цикл проверки ответов] ---")
-                cursor = db_connection.cursor()
-                cursor.execute(f"SELECT id, topic_link, post_count, current_judge, topic_title FROM {TABLE_NAME} WHERE status = 'f'")
-                cases_to_check = cursor.fetchall()
-                print(f"Найдено {len(cases_to_check)} исков в статусе 'f' для проверки.")
-                for case_id, topic_link, db_post_count, current_judge, topic_title in cases_to_check:
-                    print(f"Проверяю иск #{case_id}...")
-                    answers_text, page_post_count = scrape_thread_answers(selenium_driver, topic_link)
-                    if page_post_count > (db_post_count or 0):
-                        print(f"  ! ОБНАРУЖЕН НОВЫЙ ОТВЕТ в иске #{case_id} ({page_post_count} > {db_post_count})")
-                        cursor.execute(f"UPDATE {TABLE_NAME} SET answers = ?, post_count = ? WHERE id = ?", (answers_text, page_post_count, case_id))
-                        db_connection.commit()
-                        judge_tg_id = get_judge_tg_id(db_connection, current_judge)
-                        if judge_tg_id:
-                            print(f"  -> Запускаю уведомитель для судьи {current_judge} по иску #{case_id}...")
-                            subprocess.run(['python', 'notifier.py', 'new_reply', topic_title, str(case_id), str(judge_tg_id)])
-                print("--- [Цикл проверки ответов завершен] ---")
-
-            print("\n--- [Цикл проверки новых исков] ---")
-            processed_links = load_processed_topics_from_db(db_connection, TABLE_NAME)
-            selenium_driver.get(FORUM_URL)
-            topic_container = WebDriverWait(selenium_driver, 20).until(EC.presence_of_element_located((By.CSS_SELECTOR, TOPIC_CONTAINER_SELECTOR)))
-            
-            all_topics_on_page = []
-            thread_items = topic_container.find_elements(By.CSS_SELECTOR, INDIVIDUAL_THREAD_ITEM_SELECTOR)
-            for item in thread_items:
-                try:
-                    if 'is-locked' in item.get_attribute("class"): continue
-                    link_element = item.find_element(By.CSS_SELECTOR, THREAD_TITLE_LINK_SELECTOR)
-                    title = link_element.text.strip()
-                    url = urljoin(FORUM_URL, link_element.get_attribute("href"))
-                    if url: all_topics_on_page.append({'title': title, 'url': url})
-                except StaleElementReferenceException:
-                    print("  Предупреждение: StaleElementReferenceException, страница обновилась. Начинаю заново.")
-                    break
-            
-            new_topic_found_this_cycle = False
-            for topic_data in all_topics_on_page:
-                title = topic_data['title']
-                url = topic_data['url']
-                if url not in processed_links:
-                    print(f"\n  Найдена новая тема: {title}")
-                    pub_date, plain_text, parsed_details, media_links, temp_screenshot = get_topic_details(selenium_driver, url, url)
-                    
-                    if parsed_details is None: parsed_details = {}
-                    
-                    case_num_match = CASE_NUMBER_PATTERN.search(title)
-                    extracted_case_number = case_num_match.group(1) if case_num_match else None
-                    if not extracted_case_number: print(f"    ПРЕДУПРЕЖДЕНИЕ: Не удалось извлечь номер иска из заголовка '{title}'.")
-
-                    data_to_save = {
-                        'topic_title': title, 'topic_link': url, 'publication_time': pub_date, 
-                        'full_text': plain_text, 'case_num': extracted_case_number,
-                        'applicant_name': parsed_details.get('applicant'), 'officer_name': parsed_details.get('officer'),
-                        'media_references': json.dumps(media_links) if media_links else None
-                    }
-                    new_id = insert_topic_data(db_connection, TABLE_NAME, data_to_save)
-                    if new_id:
-                        if temp_screenshot and os.path.exists(temp_screenshot):
-                            final_screenshot_path = os.path.join('screenshots', f'case_{new_id}.png')
-                            os.rename(temp_screenshot, final_screenshot_path)
-                            cursor = db_connection.cursor()
-                            cursor.execute(f"UPDATE {TABLE_NAME} SET screen = ? WHERE id = ?", (final_screenshot_path, new_id))
-                            db_connection.commit()
-                        
-                        subprocess.run(['python', 'notifier.py', 'new_case', title, str(new_id)])
-                    
-                    new_topic_found_this_cycle = True
-                    break
-            
-            if not new_topic_found_this_cycle: print("Новых тем не найдено.")
-            print(f"Следующая проверка через {REFRESH_INTERVAL_SECONDS} секунд...")
-            time.sleep(REFRESH_INTERVAL_SECONDS)
+        print(f"Запускаю мониторинг форума (режим: {DISCOVERY_MODE})...")
+        for task in tasks: task.start()
+        while any(task.is_alive() for task in tasks):
+            for task in tasks: task.join(timeout=0.5)
     except KeyboardInterrupt: 
         print("\nСкрипт остановлен пользователем.")
     finally: 
-        if 'selenium_driver' in locals() and selenium_driver: selenium_driver.quit() 
-        if 'db_connection' in locals() and db_connection: db_connection.close() 
+        stop_event.set()
+        for task in tasks:
+            if task.is_alive(): task.join()
         print("Скрипт завершил работу.")
@@ -6,6 +6,8 @@ import os
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 
+from telegram_outbound import SchedulerRateLimiter
+
 # --- НАСТРОЙКИ ---
 SUGGESTION_BOT_TOKEN = os.environ.get("SUGGESTION_BOT_TOKEN", "8004330201:AAHTfPT9gn16pFcQP5FDP2SJ2weZhcKfYy4")
 
@@ -98,7 +100,8 @@ def main() -> None:
         return
 
     # База данных больше не нужна, убираем ее из контекста
-    application = Application.builder().token(SUGGESTION_BOT_TOKEN).build()
+    # У этого бота свой токен, а значит и свои лимиты Telegram - отдельный планировщик
+    application = Application.builder().token(SUGGESTION_BOT_TOKEN).rate_limiter(SchedulerRateLimiter()).build()
 
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", start_command))
@@ -0,0 +1,248 @@
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque, Counter
+
+from telegram.ext import BaseRateLimiter
+
+# --- Лимиты Telegram Bot API ---
+# Около 30 сообщений в секунду на бота в целом - берем с запасом
+TELEGRAM_GLOBAL_RATE = 25
+TELEGRAM_GLOBAL_BURST = 25
+# В один личный чат - не чаще сообщения в секунду, в группу - около 20 в минуту
+PRIVATE_CHAT_INTERVAL_SECONDS = 1.0
+GROUP_CHAT_INTERVAL_SECONDS = 3.0
+MAX_RETRY_AFTER_ATTEMPTS = 3 # Сколько раз планировщик сам повторяет запрос после 429
+
+# --- Приоритеты исходящих сообщений (меньше - срочнее) ---
+PRIORITY_STATUS = 0       # Ответы пользователю и статусные сообщения задач
+PRIORITY_NOTIFICATION = 1 # Уведомления скрапера о новых исках и ответах
+PRIORITY_BROADCAST = 2    # /broadcast
+
+# Запросы без отправки сообщений в чат не ограничиваются планировщиком
+UNSCHEDULED_ENDPOINTS = {"sendChatAction"}
+QUEUE_DEPTH_WARNING = 100 # С какой глубины очереди писать предупреждение в лог
+QUEUE_DEPTH_WARNING_INTERVAL_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(retry_after) -> float:
+    # В новых версиях python-telegram-bot retry_after - timedelta, в старых - число секунд
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class RetryLater(Exception):
+    """Telegram ответил 429: повторить запрос можно через retry_after секунд."""
+    def __init__(self, retry_after):
+        super().__init__(f"Telegram просит повторить запрос через {retry_after} с.")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: в среднем не больше rate отправок в секунду, всплеск до burst.
+    pause() останавливает выдачу токенов целиком - так обрабатывается retry_after из ответа 429.
+    """
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class OutboundRequest:
+    __slots__ = ('priority', 'seq', 'send', 'future', 'retries')
+
+    def __init__(self, priority, seq, send, future):
+        self.priority = priority
+        self.seq = seq
+        self.send = send
+        self.future = future
+        self.retries = 0
+
+
+class OutboundScheduler:
+    """
+    Единая очередь исходящих запросов одного бота (лимиты Telegram считаются на токен,
+    поэтому планировщик - один на процесс и токен).
+    - В пределах чата запросы уходят строго по порядку и по одному.
+    - Между чатами первым уходит запрос с наивысшим приоритетом, при равном - более ранний.
+    - Общий темп задает TokenBucket, темп в один чат - PRIVATE/GROUP_CHAT_INTERVAL_SECONDS.
+    - На 429 (исключение с атрибутом retry_after) планировщик ставит на паузу все отправки
+      и повторяет запрос первым в его чате.
+    """
+    def __init__(self, bucket: TokenBucket = None):
+        self.bucket = bucket or TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST)
+        self.chat_queues = {}      # chat_id -> deque[OutboundRequest]
+        self.busy_chats = set()    # чаты, запрос в которые сейчас выполняется
+        self.next_allowed_at = {}  # chat_id -> time.monotonic(), раньше которого в чат не пишем
+        self.max_depth = 0
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self._running = set() # Ссылки на выполняющиеся запросы, чтобы задачи не собрал сборщик мусора
+        self._last_depth_warning = 0.0
+
+    # --- Метрики ---
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.chat_queues.values())
+
+    def depth_by_priority(self) -> Counter:
+        return Counter(request.priority for queue in self.chat_queues.values() for request in queue)
+
+    # --- Запуск и остановка ---
+    def start(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for queue in self.chat_queues.values():
+            for request in queue:
+                request.future.cancel()
+        self.chat_queues.clear()
+
+    # --- Постановка в очередь ---
+    async def submit(self, chat_id, send, priority: int = PRIORITY_STATUS):
+        """send - функция без аргументов, возвращающая корутину запроса. Возвращает результат запроса."""
+        self.start()
+        request = OutboundRequest(priority, next(self._seq), send, asyncio.get_running_loop().create_future())
+        self.chat_queues.setdefault(chat_id, deque()).append(request)
+        self._check_depth()
+        self._wakeup.set()
+        return await request.future
+
+    def _check_depth(self):
+        depth = self.depth
+        self.max_depth = max(self.max_depth, depth)
+        now = time.monotonic()
+        if depth >= QUEUE_DEPTH_WARNING and now - self._last_depth_warning > QUEUE_DEPTH_WARNING_INTERVAL_SECONDS:
+            self._last_depth_warning = now
+            logger.warning(f"Очередь исходящих сообщений: {depth} (по приоритетам: {dict(self.depth_by_priority())}).")
+
+    # --- Диспетчер ---
+    @staticmethod
+    def _chat_interval(chat_id) -> float:
+        return PRIVATE_CHAT_INTERVAL_SECONDS if isinstance(chat_id, int) and chat_id > 0 else GROUP_CHAT_INTERVAL_SECONDS
+
+    def _pick(self):
+        """Возвращает (чат с самым срочным готовым запросом, None) или (None, сколько ждать до готовности)."""
+        now = time.monotonic()
+        best_chat, best_key, wait = None, None, None
+        for chat_id, queue in list(self.chat_queues.items()):
+            while queue and queue[0].future.done(): # Вызывающий уже не ждет (отменен)
+                queue.popleft()
+            if not queue:
+                if chat_id not in self.busy_chats:
+                    del self.chat_queues[chat_id]
+                continue
+            if chat_id in self.busy_chats:
+                continue
+            ready_in = self.next_allowed_at.get(chat_id, 0) - now
+            if ready_in > 0:
+                wait = ready_in if wait is None else min(wait, ready_in)
+                continue
+            key = (queue[0].priority, queue[0].seq)
+            if best_key is None or key < best_key:
+                best_chat, best_key = chat_id, key
+        if best_chat is not None:
+            return best_chat, None
+        # Старые отметки темпа больше не нужны
+        self.next_allowed_at = {chat_id: at for chat_id, at in self.next_allowed_at.items() if at > now}
+        return None, wait
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            chat_id, wait = self._pick()
+            if chat_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.bucket.acquire()
+            # Пока ждали токен, мог прийти более срочный запрос - выбираем заново
+            chat_id, _ = self._pick()
+            if chat_id is None:
+                continue
+            request = self.chat_queues[chat_id].popleft()
+            self.busy_chats.add(chat_id)
+            self.next_allowed_at[chat_id] = time.monotonic() + self._chat_interval(chat_id)
+            task = asyncio.create_task(self._run(chat_id, request))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, chat_id, request: OutboundRequest):
+        try:
+            result = await request.send()
+        except Exception as e:
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None and request.retries < MAX_RETRY_AFTER_ATTEMPTS:
+                request.retries += 1
+                logger.warning(f"Telegram ограничил отправку (429), пауза {retry_after} с.")
+                self.bucket.pause(retry_after_seconds(retry_after))
+                self.chat_queues.setdefault(chat_id, deque()).appendleft(request)
+            elif not request.future.done():
+                request.future.set_exception(e)
+        else:
+            if not request.future.done():
+                request.future.set_result(result)
+        finally:
+            self.busy_chats.discard(chat_id)
+            self._wakeup.set()
+
+
+class SchedulerRateLimiter(BaseRateLimiter):
+    """
+    Подключает OutboundScheduler к python-telegram-bot (ApplicationBuilder.rate_limiter):
+    все запросы бота, адресованные чату, проходят через планировщик.
+    Приоритет задается аргументом rate_limit_args={'priority': PRIORITY_BROADCAST} у методов бота.
+    """
+    def __init__(self, scheduler: OutboundScheduler = None):
+        self.scheduler = scheduler or OutboundScheduler()
+
+    async def initialize(self) -> None:
+        self.scheduler.start()
+
+    async def shutdown(self) -> None:
+        await self.scheduler.stop()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None or endpoint in UNSCHEDULED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+        priority = (rate_limit_args or {}).get('priority', PRIORITY_STATUS)
+        return await self.scheduler.submit(chat_id, lambda: callback(*args, **kwargs), priority)
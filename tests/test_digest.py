@@ -0,0 +1,66 @@
+import pytest
+
+import outbox
+
+
+def test_group_notifications_groups_by_type_and_target(monkeypatch):
+    monkeypatch.setattr(outbox, "DIGEST_WINDOW_SECONDS", 20)
+    rows = [
+        (1, "new_case", "Иск 1", "10", None),
+        (2, "new_reply", "Иск 2", "11", 555),
+        (3, "new_case", "Иск 3", "12", None),
+        (4, "new_reply", "Иск 4", "13", 777),
+        (5, "new_reply", "Иск 5", "14", 555),
+    ]
+    assert outbox.group_notifications(rows) == [
+        ([1, 3], "new_case", None, [("Иск 1", "10"), ("Иск 3", "12")]),
+        ([2, 5], "new_reply", 555, [("Иск 2", "11"), ("Иск 5", "14")]),
+        ([4], "new_reply", 777, [("Иск 4", "13")]),
+    ]
+
+
+def test_group_notifications_splits_at_max_items(monkeypatch):
+    monkeypatch.setattr(outbox, "DIGEST_WINDOW_SECONDS", 20)
+    monkeypatch.setattr(outbox, "DIGEST_MAX_ITEMS", 2)
+    rows = [(i, "new_case", f"Иск {i}", str(i), None) for i in range(1, 6)]
+    assert [group[0] for group in outbox.group_notifications(rows)] == [[1, 2], [3, 4], [5]]
+
+
+def test_group_notifications_without_window_sends_one_by_one(monkeypatch):
+    monkeypatch.setattr(outbox, "DIGEST_WINDOW_SECONDS", 0)
+    rows = [(i, "new_case", f"Иск {i}", str(i), None) for i in range(1, 4)]
+    assert [group[0] for group in outbox.group_notifications(rows)] == [[1], [2], [3]]
+
+
+def test_select_ready_groups_leading_edge():
+    first = ([1], "new_case", None, [("Иск 1", "10")])
+    reply = ([2], "new_reply", 555, [("Иск 2", "11")])
+    # Первое уведомление всплеска уходит сразу
+    assert outbox.select_ready_groups([first, reply], {}, now=100.0, window_seconds=20) == [first, reply]
+    # Следующие в пределах окна ждут, остальные получатели не задерживаются
+    last_sent_at = {("new_case", None): 90.0}
+    assert outbox.select_ready_groups([first, reply], last_sent_at, now=100.0, window_seconds=20) == [reply]
+    # По окончании окна накопленное уходит
+    assert outbox.select_ready_groups([first], last_sent_at, now=110.0, window_seconds=20) == [first]
+
+
+def import_notifier():
+    pytest.importorskip("httpx")
+    pytest.importorskip("telegram")
+    import notifier
+    return notifier
+
+
+def test_format_digest_single_item_is_plain_notification():
+    notifier = import_notifier()
+    assert notifier.format_digest("new_case", [("Жалоба", "7")]) == notifier.format_notification("new_case", "Жалоба", "7")
+
+
+def test_format_digest_lists_items_and_escapes_html():
+    notifier = import_notifier()
+    message = notifier.format_digest("new_case", [("Жалоба <1>", "7"), ("Жалоба & 2", "8")])
+    assert "(2)" in message
+    assert "<b>#7: Жалоба &lt;1&gt;</b>" in message
+    assert "<b>#8: Жалоба &amp; 2</b>" in message
+    reply = notifier.format_digest("new_reply", [("А", "1"), ("Б", "2")])
+    assert reply.startswith("🔔") and "#1: А" in reply and "#2: Б" in reply
@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+for module_name in ("requests", "bs4", "PIL", "selenium", "webdriver_manager"):
+    pytest.importorskip(module_name)
+
+import sender
+from sender import FeedWatcher
+
+FEED_XML = b"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:slash="http://purl.org/rss/1.0/modules/slash/"><channel>
+<item><link>https://forum.arizona-rp.com/threads/zhaloba.101/</link><slash:comments>2</slash:comments></item>
+<item><link>https://forum.arizona-rp.com/threads/zhaloba.100/</link><slash:comments>0</slash:comments></item>
+</channel></rss>"""
+
+
+class FeedResponse:
+    def __init__(self, status_code, content=b""):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {'ETag': '"v1"'}
+
+    def raise_for_status(self):
+        pass
+
+
+class FeedSession:
+    """Отдает ленту на первый запрос и 304 на все условные."""
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests += 1
+        return FeedResponse(304) if headers else FeedResponse(200, FEED_XML)
+
+
+def test_parse_feed_reads_thread_ids_and_reply_counts():
+    assert sender.parse_feed(FEED_XML) == [(101, "2"), (100, "0")]
+
+
+def test_feed_change_stays_pending_until_html_pass_succeeds():
+    session = FeedSession()
+    watcher = FeedWatcher("https://forum.arizona-rp.com/forums/3400/index.rss", session)
+    assert watcher.has_changes()
+    # Проход по HTML упал - изменение не теряется, хотя лента отвечает 304
+    assert watcher.has_changes()
+    assert watcher.has_changes()
+    assert session.requests == 1
+    watcher.mark_processed()
+    assert not watcher.has_changes()
+    assert session.requests == 2
+
+
+def test_insert_topics_batch_raises_on_database_error():
+    conn = sqlite3.connect(":memory:") # Таблицы исков нет - вставка не проходит
+    with pytest.raises(sqlite3.Error):
+        sender.insert_topics_batch(conn, sender.TABLE_NAME, [{'topic_link': "https://forum.arizona-rp.com/threads/zhaloba.101/"}])
+    conn.close()
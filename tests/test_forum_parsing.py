@@ -0,0 +1,90 @@
+import pytest
+
+for module_name in ("requests", "bs4", "PIL", "selenium", "webdriver_manager"):
+    pytest.importorskip(module_name)
+
+import sender
+
+BASE_URL = "https://forum.arizona-rp.com/forums/3400/"
+TOPIC_URL = "https://forum.arizona-rp.com/threads/zhaloba-na-sotrudnika.101/"
+
+THREAD_LIST_HTML = """
+<html><body>
+<div class="structItemContainer-group structItemContainer-group--sticky">
+  <div class="structItem structItem--thread is-sticky js-inlineModContainer">
+    <div class="structItem-cell structItem-cell--main">
+      <div class="structItem-title"><a href="/threads/pravila-podachi.50/">Правила подачи</a></div>
+    </div>
+    <div class="structItem-cell structItem-cell--meta"><dl class="pairs pairs--justified"><dt>Ответы</dt><dd>0</dd></dl></div>
+    <div class="structItem-cell structItem-cell--latest"><time class="u-dt" data-time="1690000000"></time></div>
+  </div>
+</div>
+<div class="structItemContainer-group js-threadList">
+  <div class="structItem structItem--thread js-inlineModContainer">
+    <div class="structItem-cell structItem-cell--main">
+      <div class="structItem-title"><a href="/threads/zhaloba-na-sotrudnika.101/">Жалоба на <b>сотрудника</b></a></div>
+    </div>
+    <div class="structItem-cell structItem-cell--meta"><dl class="pairs pairs--justified"><dt>Ответы</dt><dd>2</dd></dl></div>
+    <div class="structItem-cell structItem-cell--latest"><time class="u-dt" data-time="1700000100"></time></div>
+  </div>
+  <div class="structItem structItem--thread is-locked js-inlineModContainer">
+    <div class="structItem-cell structItem-cell--main">
+      <div class="structItem-title"><a href="/threads/zakrytaya-zhaloba.99/">Закрытая жалоба</a></div>
+    </div>
+    <div class="structItem-cell structItem-cell--meta"><dl class="pairs pairs--justified"><dt>Ответы</dt><dd>5</dd></dl></div>
+    <div class="structItem-cell structItem-cell--latest"><time class="u-dt" datetime="2023-11-14T22:00:00+0300"></time></div>
+  </div>
+</div>
+</body></html>
+"""
+
+TOPIC_HTML = """
+<html><body>
+<article class="message message--post js-post js-inlineModContainer">
+  <div class="message-cell message-cell--user">Ivan_Ivanov</div>
+  <div class="message-cell message-cell--main">
+    <time class="u-dt" datetime="2023-11-14T22:00:00+0300" title="14.11.2023 в 22:00">14 ноя 2023</time>
+    <div class="message-content js-messageContent">
+      <div class="bbWrapper">1) Ваш игровой ник (Nick_Name): Ivan_Ivanov<br>
+2) Ник сотрудника, который нарушал: Petr_Petrov<br>
+<a href="/attachments/screen-1/">скриншот</a>
+<a href="https://imgur.com/abc.png">доказательство</a>
+<a href="https://i.imgur.com/jfsvriz.png">баннер</a>
+<a href="#post-1">якорь</a>
+<a href="mailto:admin@example.com">почта</a></div>
+    </div>
+  </div>
+</article>
+<article class="message message--post js-post js-inlineModContainer">
+  <div class="message-cell message-cell--main">
+    <div class="message-content js-messageContent"><div class="bbWrapper">Ответ</div></div>
+  </div>
+</article>
+</body></html>
+"""
+
+
+# --- Разбор страниц форума ---
+def test_parse_thread_list_page_skips_locked_and_counts_all_threads():
+    topics, counters = sender.parse_thread_list_page(THREAD_LIST_HTML, BASE_URL)
+    assert topics == [{'title': "Жалоба на сотрудника", 'url': TOPIC_URL}]
+    assert counters == {50: ("0", "1690000000"), 101: ("2", "1700000100"), 99: ("5", "2023-11-14T22:00:00+0300")}
+
+
+def test_parse_thread_list_page_without_thread_list_raises():
+    with pytest.raises(ValueError):
+        sender.parse_thread_list_page("<html><body>Checking your browser...</body></html>", BASE_URL)
+
+
+def test_parse_topic_details_reads_first_post():
+    pub_date, plain_text, details, media_links, post_html = sender.parse_topic_details(TOPIC_HTML, TOPIC_URL)
+    assert pub_date == "14.11.2023 в 22:00"
+    assert "Ответ" not in plain_text
+    assert details == {"applicant": "Ivan_Ivanov", "officer": "Petr_Petrov"}
+    assert media_links == ["https://forum.arizona-rp.com/attachments/screen-1/", "https://imgur.com/abc.png"]
+    assert "Petr_Petrov" in post_html and "<article" not in post_html
+
+
+def test_parse_topic_details_without_post_raises():
+    with pytest.raises(ValueError):
+        sender.parse_topic_details("<html><body>Тема удалена</body></html>", TOPIC_URL)
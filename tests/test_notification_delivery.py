@@ -0,0 +1,55 @@
+import sqlite3
+import asyncio
+
+import pytest
+
+import outbox
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    outbox.setup_outbox(conn)
+    yield conn
+    conn.close()
+
+
+def test_delivered_chat_ids_require_every_notification_of_digest(conn):
+    outbox.record_delivery(conn, [1, 2], 111, "sent", 1)
+    outbox.record_delivery(conn, [1], 222, "sent", 1)
+    outbox.record_delivery(conn, [1, 2], 333, "failed", 3, "HTTP 403")
+    assert outbox.get_delivered_chat_ids(conn, [1, 2]) == {111}
+    assert outbox.get_delivered_chat_ids(conn, [1]) == {111, 222}
+    assert outbox.get_delivered_chat_ids(conn, [3]) == set()
+
+
+def test_send_notification_skips_already_delivered_recipients(conn):
+    pytest.importorskip("httpx")
+    pytest.importorskip("telegram")
+    import notifier
+
+    conn.execute(f"CREATE TABLE {notifier.USERS_TABLE_NAME} (tg_user_id INTEGER, nick_name TEXT, authorization INTEGER)")
+    conn.execute(f"CREATE TABLE {notifier.WHITELIST_TABLE_NAME} (nick_name TEXT)")
+    conn.executemany(f"INSERT INTO {notifier.USERS_TABLE_NAME} VALUES (?, ?, 1)", [(111, "A"), (222, "B")])
+    conn.executemany(f"INSERT INTO {notifier.WHITELIST_TABLE_NAME} VALUES (?)", [("A",), ("B",)])
+    # Прошлая попытка успела доставить дайджест первому судье
+    outbox.record_delivery(conn, [1, 2], 111, "sent", 1)
+
+    async def main():
+        sender = notifier.TelegramSender()
+        sent_to = []
+
+        async def send_message(chat_id, message_text):
+            sent_to.append(chat_id)
+            return 'sent', 1, None
+
+        sender.send_message = send_message
+        try:
+            result = await sender.send_notification(conn, "текст", None, [1, 2])
+        finally:
+            await sender.close()
+        return result, sent_to
+
+    (success_count, fail_count), sent_to = asyncio.run(main())
+    assert sent_to == [222]
+    assert (success_count, fail_count) == (1, 0)
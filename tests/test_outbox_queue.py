@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+import outbox
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    outbox.setup_outbox(conn)
+    yield conn
+    conn.close()
+
+
+def test_enqueue_and_fetch_pending(conn):
+    outbox.enqueue_notification(conn.cursor(), "new_case", "Иск", 42)
+    outbox.enqueue_notification(conn.cursor(), "new_reply", "Иск", 43, 555)
+    conn.commit()
+    rows = outbox.fetch_pending_notifications(conn)
+    assert [row[1:] for row in rows] == [("new_case", "Иск", "42", None), ("new_reply", "Иск", "43", 555)]
+    outbox.mark_notifications(conn, [rows[0][0]], "sent")
+    assert [row[0] for row in outbox.fetch_pending_notifications(conn)] == [rows[1][0]]
+
+
+def test_recover_notifications_returns_sending_to_queue(conn):
+    outbox.enqueue_notification(conn.cursor(), "new_case", "Иск", 1)
+    conn.commit()
+    notification_id = outbox.fetch_pending_notifications(conn)[0][0]
+    outbox.mark_notification(conn, notification_id, "sending")
+    assert outbox.fetch_pending_notifications(conn) == []
+    outbox.recover_notifications(conn)
+    assert [row[0] for row in outbox.fetch_pending_notifications(conn)] == [notification_id]
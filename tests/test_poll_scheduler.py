@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+for module_name in ("requests", "bs4", "PIL", "selenium", "webdriver_manager"):
+    pytest.importorskip(module_name)
+
+import sender
+from sender import PollScheduler
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(sender.random, "uniform", lambda low, high: 1.0)
+    monkeypatch.setattr(PollScheduler, "is_quiet_hour", staticmethod(lambda: False))
+
+
+def test_poll_scheduler_base_interval(no_jitter):
+    scheduler = PollScheduler(10, min_interval=2, quiet_interval=60)
+    assert scheduler.next_interval() == 10
+    assert scheduler.reason == "базовый интервал"
+
+
+def test_poll_scheduler_backs_off_on_errors(no_jitter):
+    scheduler = PollScheduler(10, min_interval=2, quiet_interval=60)
+    scheduler.record_error()
+    assert scheduler.next_interval() == 20
+    scheduler.record_error()
+    assert scheduler.next_interval() == 40
+    for _ in range(10): scheduler.record_error()
+    assert scheduler.next_interval() == sender.MAX_BACKOFF_SECONDS
+    scheduler.record_success()
+    assert scheduler.next_interval() == 10
+
+
+def test_poll_scheduler_polls_faster_after_arrivals(no_jitter):
+    scheduler = PollScheduler(10, min_interval=2, quiet_interval=60)
+    scheduler.record_arrivals(1)
+    assert scheduler.next_interval() == 5
+    scheduler.record_arrivals(20)
+    assert scheduler.next_interval() == 2
+    # События старше окна не учитываются
+    scheduler.arrivals.clear()
+    scheduler.arrivals.append(time.monotonic() - sender.ARRIVAL_WINDOW_SECONDS - 1)
+    assert scheduler.next_interval() == 10
+    assert not scheduler.arrivals
+
+
+def test_poll_scheduler_quiet_hours(monkeypatch, no_jitter):
+    monkeypatch.setattr(PollScheduler, "is_quiet_hour", staticmethod(lambda: True))
+    scheduler = PollScheduler(10, min_interval=2, quiet_interval=60)
+    assert scheduler.next_interval() == 60
+    scheduler.record_arrivals(1) # Активность важнее тихих часов
+    assert scheduler.next_interval() == 5
+
+
+def test_poll_scheduler_jitter_stays_in_bounds():
+    scheduler = PollScheduler(10, min_interval=2, quiet_interval=10)
+    for _ in range(50):
+        assert 10 * (1 - sender.POLL_JITTER_FRACTION) <= scheduler.next_interval() <= 10 * (1 + sender.POLL_JITTER_FRACTION)
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+for module_name in ("requests", "bs4", "PIL", "selenium", "webdriver_manager"):
+    pytest.importorskip(module_name)
+
+import sender
+from sender import ReplyCounterIndex
+from outbox import OUTBOX_TABLE_NAME
+
+
+def thread_url(thread_id):
+    return f"https://forum.arizona-rp.com/threads/zhaloba.{thread_id}/"
+
+
+def test_reply_counter_index_selects_only_changed_threads():
+    index = ReplyCounterIndex()
+    cases = [(1, thread_url(101)), (2, thread_url(102)), (3, thread_url(103))]
+    counters = {101: ("2", "1700000100"), 102: ("0", "1700000000")}
+    # Первый проход: все темы со счетчиками, скрытые - только по запросу
+    assert index.select_changed(cases, counters, include_hidden=False) == cases[:2]
+    assert index.select_changed(cases, counters, include_hidden=True) == cases
+    index.remember(thread_url(101), counters)
+    index.remember(thread_url(102), counters)
+    index.remember(thread_url(103), counters)
+    assert index.select_changed(cases, counters, include_hidden=False) == []
+    counters[102] = ("1", "1700000200")
+    assert index.select_changed(cases, counters, include_hidden=False) == [cases[1]]
+
+
+def test_failed_reply_write_is_retried_next_cycle(monkeypatch):
+    conn = sender.setup_database(":memory:", sender.TABLE_NAME)
+    conn.execute("CREATE TABLE Users_DB (tg_user_id INTEGER, nick_name TEXT)")
+    conn.execute("INSERT INTO Users_DB VALUES (555, 'Judge_Nick')")
+    conn.execute(f"INSERT INTO {sender.TABLE_NAME} (id, topic_link, topic_title, status, current_judge, post_count) "
+                 f"VALUES (1, ?, 'Жалоба', 'f', 'Judge_Nick', 1)", (thread_url(101),))
+    conn.commit()
+    monkeypatch.setattr(sender, "check_thread_answers", lambda session, cases, browser: {1: ("Ответ", 2)})
+    index = ReplyCounterIndex()
+    counters = {101: ("1", "1700000100")}
+
+    # Запись ответа не проходит (как при занятой ботом БД)
+    conn.execute(f"CREATE TRIGGER fail_update BEFORE UPDATE ON {sender.TABLE_NAME} BEGIN SELECT RAISE(ABORT, 'database is locked'); END")
+    with pytest.raises(sqlite3.DatabaseError):
+        sender.run_reply_check(conn, None, index, counters, False, None)
+    conn.execute("DROP TRIGGER fail_update")
+
+    # Счетчики не запомнены - тема проверяется снова, ответ и уведомление не теряются
+    assert sender.run_reply_check(conn, None, index, counters, False, None) == 1
+    assert conn.execute(f"SELECT post_count FROM {sender.TABLE_NAME} WHERE id = 1").fetchone() == (2,)
+    assert conn.execute(f"SELECT COUNT(*) FROM {OUTBOX_TABLE_NAME}").fetchone() == (1,)
+    assert sender.run_reply_check(conn, None, index, counters, False, None) == 0
+    conn.close()
@@ -0,0 +1,28 @@
+import pytest
+
+for module_name in ("requests", "bs4", "PIL", "selenium", "webdriver_manager"):
+    pytest.importorskip(module_name)
+
+import sender
+from case_status import FINAL_CASE_STATUSES
+
+
+def test_prune_old_screenshots_covers_every_final_status(tmp_path):
+    conn = sender.setup_database(":memory:", sender.TABLE_NAME)
+    statuses = list(FINAL_CASE_STATUSES) + ['a', 'f']
+    for case_id, status in enumerate(statuses, start=1):
+        screen = tmp_path / f"{case_id}.jpg"
+        screen.write_bytes(b"jpeg")
+        conn.execute(f"INSERT INTO {sender.TABLE_NAME} (id, status, screen, topic_link) VALUES (?, ?, ?, ?)",
+                     (case_id, status, str(screen), f"https://forum.arizona-rp.com/threads/zhaloba.{case_id}/"))
+    # Все статусы сменились давно, кроме последнего завершенного иска
+    conn.execute(f"UPDATE {sender.TABLE_NAME} SET status_changed_at = datetime('now', '-60 days')")
+    conn.execute(f"UPDATE {sender.TABLE_NAME} SET status_changed_at = CURRENT_TIMESTAMP WHERE id = ?", (len(FINAL_CASE_STATUSES),))
+    conn.commit()
+
+    sender.prune_old_screenshots(conn)
+
+    kept = {row[0] for row in conn.execute(f"SELECT id FROM {sender.TABLE_NAME} WHERE screen IS NOT NULL")}
+    assert kept == {len(FINAL_CASE_STATUSES), len(statuses) - 1, len(statuses)}
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(f"{case_id}.jpg" for case_id in kept)
+    conn.close()
@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+for module_name in ("requests", "bs4", "PIL", "selenium", "webdriver_manager"):
+    pytest.importorskip(module_name)
+
+from sender import SeenTopicIndex
+
+
+def make_topics_db(links):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Cases_DB (topic_link TEXT)")
+    conn.executemany("INSERT INTO Cases_DB VALUES (?)", [(link,) for link in links])
+    return conn
+
+
+def thread_url(thread_id):
+    return f"https://forum.arizona-rp.com/threads/zhaloba.{thread_id}/"
+
+
+def test_seen_topic_index_knows_loaded_and_added_links():
+    index = SeenTopicIndex(make_topics_db([thread_url(100)]), "Cases_DB", id_window=None)
+    assert thread_url(100) in index
+    assert thread_url(101) not in index
+    index.add(thread_url(101))
+    assert thread_url(101) in index
+    assert index.max_thread_id == 101
+    # Без окна старые непросмотренные темы не считаются обработанными
+    assert thread_url(5) not in index
+
+
+def test_seen_topic_index_id_window_treats_old_threads_as_seen():
+    index = SeenTopicIndex(make_topics_db([thread_url(100), thread_url(1000)]), "Cases_DB", id_window=500)
+    assert thread_url(100) not in index.links # Вытеснена из памяти при загрузке
+    assert thread_url(100) in index
+    assert thread_url(400) in index
+    assert thread_url(600) not in index
+    assert "https://forum.arizona-rp.com/forums/3400/" not in index
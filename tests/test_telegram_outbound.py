@@ -0,0 +1,144 @@
+import time
+import asyncio
+
+import pytest
+
+pytest.importorskip("telegram")
+
+import telegram_outbound
+from telegram_outbound import (OutboundScheduler, TokenBucket, RetryLater,
+                               PRIORITY_STATUS, PRIORITY_NOTIFICATION, PRIORITY_BROADCAST)
+
+
+@pytest.fixture(autouse=True)
+def short_chat_intervals(monkeypatch):
+    monkeypatch.setattr(telegram_outbound, "PRIVATE_CHAT_INTERVAL_SECONDS", 0.02)
+    monkeypatch.setattr(telegram_outbound, "GROUP_CHAT_INTERVAL_SECONDS", 0.02)
+
+
+def run_with_scheduler(test, bucket=None):
+    async def main():
+        scheduler = OutboundScheduler(bucket or TokenBucket(1000, 1000))
+        try:
+            return await test(scheduler)
+        finally:
+            await scheduler.stop()
+    return asyncio.run(main())
+
+
+def test_token_bucket_limits_rate_after_burst():
+    async def main():
+        bucket = TokenBucket(rate=20, burst=2)
+        started = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        assert time.monotonic() - started < 0.04
+        await bucket.acquire() # Всплеск исчерпан - следующий токен через 1/rate
+        assert time.monotonic() - started >= 0.04
+    asyncio.run(main())
+
+
+def test_token_bucket_pause_blocks_acquire():
+    async def main():
+        bucket = TokenBucket(rate=1000, burst=10)
+        bucket.pause(0.1)
+        started = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - started >= 0.09
+    asyncio.run(main())
+
+
+def test_requests_in_one_chat_are_sent_in_order_one_at_a_time():
+    async def test(scheduler):
+        log, in_flight = [], []
+
+        def make_send(n):
+            async def send():
+                in_flight.append(n)
+                assert len(in_flight) == 1
+                log.append(n)
+                await asyncio.sleep(0.01)
+                in_flight.remove(n)
+                return n
+            return send
+
+        results = await asyncio.gather(*(scheduler.submit(100, make_send(n)) for n in range(5)))
+        assert results == list(range(5))
+        assert log == list(range(5))
+    run_with_scheduler(test)
+
+
+def test_more_urgent_chat_goes_first():
+    async def test(scheduler):
+        log = []
+
+        def make_send(chat_id):
+            async def send():
+                log.append(chat_id)
+            return send
+
+        # Все три запроса попадают в очередь до первого выбора диспетчера
+        await asyncio.gather(
+            scheduler.submit(1, make_send(1), PRIORITY_BROADCAST),
+            scheduler.submit(2, make_send(2), PRIORITY_STATUS),
+            scheduler.submit(3, make_send(3), PRIORITY_NOTIFICATION),
+        )
+        assert log == [2, 3, 1]
+    run_with_scheduler(test)
+
+
+def test_retry_after_pauses_all_chats_and_repeats_request():
+    async def test(scheduler):
+        limited = asyncio.Event()
+        attempts = []
+
+        async def limited_send():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                limited.set()
+                raise RetryLater(0.1)
+            return "ok"
+
+        async def other_send():
+            return time.monotonic()
+
+        first = asyncio.create_task(scheduler.submit(1, limited_send))
+        await limited.wait()
+        other_sent_at = await scheduler.submit(2, other_send)
+        assert await first == "ok"
+        assert len(attempts) == 2
+        # Пауза действует на весь бот, а не только на чат, получивший 429
+        assert attempts[1] - attempts[0] >= 0.09
+        assert other_sent_at - attempts[0] >= 0.09
+    run_with_scheduler(test)
+
+
+def test_retry_after_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(telegram_outbound, "MAX_RETRY_AFTER_ATTEMPTS", 2)
+
+    async def test(scheduler):
+        attempts = []
+
+        async def send():
+            attempts.append(1)
+            raise RetryLater(0.01)
+
+        with pytest.raises(RetryLater):
+            await scheduler.submit(1, send)
+        assert len(attempts) == 3
+    run_with_scheduler(test)
+
+
+def test_other_errors_reach_caller_without_retry():
+    async def test(scheduler):
+        attempts = []
+
+        async def send():
+            attempts.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            await scheduler.submit(1, send)
+        assert len(attempts) == 1
+        assert scheduler.depth == 0
+    run_with_scheduler(test)